@@ -0,0 +1,73 @@
+"""
+Chunking throughput on multi-megabyte texts: the sentence-aware single-pass
+chunker against the previous fixed word-window chunker, in word and token mode.
+
+    python -m benchmarks.chunking --megabytes 4 8 16
+    python -m benchmarks.chunking --pdfs path/to/a.pdf
+"""
+import re
+import time
+import argparse
+import tracemalloc
+
+from utils.fms import clean_and_chunk_text, extract_pages
+from utils.context import estimate_tokens
+from benchmarks.corpus import synthetic_corpus
+
+def word_window_chunks(text: str, filename: str, chunk_size: int = 200, overlap: int = 50):
+    """The previous chunker: regex clean-up, full word list, re-joined overlapping slices"""
+    words = re.sub(r'\s+', ' ', re.sub(r'\n+', ' ', text)).strip().split()
+    chunks = []
+    start_idx = 0
+    while start_idx < len(words):
+        end_idx = min(start_idx + chunk_size, len(words))
+        chunks.append({"content": ' '.join(words[start_idx:end_idx]), "document_path": filename, "offset": start_idx})
+        if end_idx >= len(words):
+            break
+        start_idx = end_idx - overlap if end_idx - overlap > 0 else end_idx
+    return chunks
+
+def measure(name: str, chunker, text: str):
+    start_time = time.perf_counter()
+    chunks = chunker(text)
+    elapsed = time.perf_counter() - start_time
+
+    # Separate run, tracemalloc slows allocation-heavy code down too much to time it
+    tracemalloc.start()
+    chunker(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    megabytes = len(text.encode("utf-8")) / 1e6
+    sizes = [len(chunk["content"].split()) for chunk in chunks]
+    print(
+        f"{name:>18}: {megabytes / elapsed:7.2f} MB/s, {len(chunks) / elapsed:9.0f} chunks/s, "
+        f"{len(chunks):6d} chunks of {min(sizes)}-{max(sizes)} words, peak {peak / 1e6:7.1f} MB"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", nargs="*", default=[])
+    parser.add_argument("--megabytes", nargs="+", type=float, default=[4, 16])
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--overlap", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.pdfs:
+        texts = {pdf: "\n".join(extract_pages(pdf)) for pdf in args.pdfs}
+    else:
+        # About 12 bytes per synthetic Cyrillic word
+        texts = {f"{size:g} MB synthetic": synthetic_corpus(1, int(size * 1e6 / 12))[0] for size in args.megabytes}
+
+    for label, text in texts.items():
+        print(f"{label} ({len(text.encode('utf-8')) / 1e6:.1f} MB)")
+        measure("word window", lambda t: word_window_chunks(t, label, args.chunk_size, args.overlap), text)
+        measure("sentences, words", lambda t: clean_and_chunk_text(t, label, args.chunk_size, args.overlap), text)
+        measure(
+            "sentences, tokens",
+            lambda t: clean_and_chunk_text(t, label, args.chunk_size, args.overlap, estimate_tokens),
+            text
+        )
+
+if __name__ == '__main__':
+    main()
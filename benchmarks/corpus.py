@@ -0,0 +1,26 @@
+"""Seeded synthetic Mongolian corpus shared by the benchmarks"""
+import random
+
+from typing import List
+
+VOCABULARY = (
+    "засгийн газар төсөв татвар иргэд санал хууль шийдвэр хөгжил эдийн засаг "
+    "бөх барилдаан наадам хурд морь уралдаан сургууль багш сурагч эмнэлэг эмч "
+    "байгаль орчин ус агаар бохирдол уул уурхай нүүрс зэс экспорт импорт зах зээл "
+    "төгрөг ханш инфляци банк зээл хүү компани ажил цалин тэтгэвэр нийслэл аймаг"
+).split()
+
+
+def synthetic_corpus(documents: int, words: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(documents):
+        sentences = []
+        remaining = words
+        while remaining > 0:
+            length = min(remaining, rng.randint(6, 24))
+            sentences.append(" ".join(rng.choice(VOCABULARY) for _ in range(length)).capitalize() + ".")
+            remaining -= length
+        # Page-like line breaks, as produced by the PDF extractor
+        corpus.append("\n".join(" ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)))
+    return corpus
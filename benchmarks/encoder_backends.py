@@ -0,0 +1,61 @@
+"""
+Recall-vs-latency comparison of quantized / truncated encoder backends against
+the full-precision model, using the chunks of the given PDFs as the corpus and
+their opening words as queries.
+
+    python -m benchmarks.encoder_backends path/to/a.pdf --dims 1024 512 256
+"""
+import time
+import random
+import argparse
+import numpy as np
+
+from utils.fms import extract_pages, stream_chunks
+from utils.encoders import SentenceTransformerEncoder
+
+def top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+def timed_encode(encoder: SentenceTransformerEncoder, texts):
+    start_time = time.perf_counter()
+    vectors = encoder.encode(texts)
+    return vectors, (time.perf_counter() - start_time) / len(texts)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--model", default="jinaai/jina-embeddings-v3")
+    parser.add_argument("--backends", nargs="+", default=["torch", "int8"])
+    parser.add_argument("--dims", nargs="+", type=int, default=[1024, 512, 256, 128])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = [
+        chunk["content"]
+        for pdf in args.pdfs
+        for chunk in stream_chunks(extract_pages(pdf), pdf)
+    ]
+    random.seed(0)
+    queries = [" ".join(text.split()[:12]) for text in random.sample(corpus, min(args.queries, len(corpus)))]
+
+    reference = SentenceTransformerEncoder(args.model, backend="torch", device="cpu")
+    reference_corpus, reference_latency = timed_encode(reference, corpus)
+    reference_queries, _ = timed_encode(reference, queries)
+    expected = top_k(reference_corpus, reference_queries, args.k)
+    print(f"{'full model':>22}: recall@{args.k} 1.000, {reference_latency * 1000:7.2f} ms/chunk, {reference.dimension * 4} B/vector")
+    reference.close()
+
+    for backend in args.backends:
+        for dim in args.dims:
+            encoder = SentenceTransformerEncoder(args.model, backend=backend, output_dim=dim, device="cpu")
+            corpus_vectors, latency = timed_encode(encoder, corpus)
+            query_vectors, _ = timed_encode(encoder, queries)
+            found = top_k(corpus_vectors, query_vectors, args.k)
+            recall = np.mean([len(set(f) & set(e)) / args.k for f, e in zip(found, expected)])
+            print(f"{backend + ' / ' + str(dim):>22}: recall@{args.k} {recall:.3f}, {latency * 1000:7.2f} ms/chunk, {dim * 4} B/vector")
+            encoder.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Memory, recall@k and query latency of HNSW / quantization settings on a running
+Weaviate (WEAVIATE_URL). The chunks of the given PDFs, or the synthetic corpus,
+are embedded once and loaded into one scratch collection per setting. Each
+collection's near-vector results are compared against exact brute-force search
+over the same vectors.
+
+    python -m benchmarks.index_settings path/to/*.pdf --quantization none pq bq sq rq --ef 64 256
+    python -m benchmarks.index_settings --hashing-encoder --output cache/index_settings.json
+
+PQ and SQ are trained on the first `training_limit` objects, which the script sets
+to the corpus size so small corpora are compressed too.
+"""
+import json
+import time
+import random
+import argparse
+import itertools
+import numpy as np
+
+from utils.fms import DEFAULT_APP_ID, chunk_id, extract_pages, stream_chunks
+from utils.dbms import WeaviateDatabaseManager, estimate_index_memory
+from benchmarks.corpus import synthetic_corpus
+from benchmarks.offline_suite import HashingEncoder
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    return np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="*")
+    parser.add_argument("--documents", type=int, default=50, help="Synthetic documents when no PDFs are given")
+    parser.add_argument("--words", type=int, default=5000)
+    parser.add_argument("--hashing-encoder", action="store_true", help="Deterministic stand-in instead of the embedding model")
+    parser.add_argument("--quantization", nargs="+", default=["none", "pq", "bq", "sq", "rq"])
+    parser.add_argument("--ef", nargs="+", type=int, default=[64, 256])
+    parser.add_argument("--ef-construction", type=int, default=128)
+    parser.add_argument("--max-connections", type=int, default=32)
+    parser.add_argument("--rescore-limit", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch collections")
+    parser.add_argument("--output", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    if args.pdfs:
+        chunks = [chunk for pdf in args.pdfs for chunk in stream_chunks(extract_pages(pdf), pdf)]
+    else:
+        chunks = [
+            chunk for i, text in enumerate(synthetic_corpus(args.documents, args.words))
+            for chunk in stream_chunks([text], f"synthetic-{i}.pdf")
+        ]
+    random.seed(0)
+    queries = [" ".join(chunk["content"].split()[:12]) for chunk in random.sample(chunks, min(args.queries, len(chunks)))]
+
+    base = WeaviateDatabaseManager(encoder=HashingEncoder(1024) if args.hashing_encoder else None)
+    corpus_vectors = np.asarray(base.embed_texts([chunk["content"] for chunk in chunks]), dtype=np.float32)
+    query_vectors = np.asarray(base.embed_texts(queries), dtype=np.float32)
+    ids = [chunk_id(chunk) for chunk in chunks]
+    expected = [{ids[i] for i in row} for row in exact_top_k(corpus_vectors, query_vectors, args.k)]
+    print(f"{len(chunks)} chunks, {len(queries)} queries, {base.encoder.dimension} dimensions, exact top-{args.k} as reference")
+
+    results = []
+    for quantization, ef in itertools.product(args.quantization, args.ef):
+        settings = {
+            "quantization": quantization,
+            "ef": ef,
+            "ef_construction": args.ef_construction,
+            "max_connections": args.max_connections,
+            "rescore_limit": args.rescore_limit,
+            "training_limit": len(chunks)
+        }
+        db = WeaviateDatabaseManager(
+            encoder=base.encoder,
+            connection=base.connection,
+            collection_name=f"IndexEval_{quantization}_ef{ef if ef > 0 else 'dynamic'}",
+            index_settings=settings,
+            retrieval_cache_size=0
+        )
+        db.run(lambda async_client: db.create_collect(async_client, recreate=True))
+
+        build_start = time.perf_counter()
+        db.run(lambda async_client: db.stream_insert(async_client, chunks, batch_size=256))
+        build_seconds = time.perf_counter() - build_start
+
+        latencies, recalls = [], []
+        for vector, reference in zip(query_vectors.tolist(), expected):
+            start_time = time.perf_counter()
+            found = db.run(lambda async_client: db._near_vector(async_client, vector, args.k, 2.0, DEFAULT_APP_ID))
+            latencies.append(time.perf_counter() - start_time)
+            recalls.append(len({result["uuid"] for result in found} & reference) / args.k)
+
+        memory = estimate_index_memory(len(chunks), base.encoder.dimension, settings)
+        result = {
+            "collection": db.collection_name,
+            "settings": settings,
+            f"recall@{args.k}": float(np.mean(recalls)),
+            "p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "p99_ms": float(np.percentile(latencies, 99) * 1000),
+            "build_seconds": build_seconds,
+            **memory
+        }
+        results.append(result)
+        print(
+            f"{quantization:>5} / ef {ef:>4}: recall@{args.k} {result[f'recall@{args.k}']:.3f}, "
+            f"p50 {result['p50_ms']:6.2f} ms, p99 {result['p99_ms']:6.2f} ms, "
+            f"~{memory['memory_bytes'] / 1e6:8.1f} MB in memory ({memory['compression']:.0f}x vectors), "
+            f"built in {build_seconds:.1f}s"
+        )
+
+        if not args.keep:
+            db.run(lambda async_client: async_client.collections.delete(db.collection_name))
+
+    base.connection.close()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
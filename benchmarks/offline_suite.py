@@ -0,0 +1,335 @@
+"""
+Offline benchmark suite for the ingestion, retrieval and streaming paths.
+
+Needs no network: embeddings come from a deterministic hashing encoder, the
+vector store is the embedded LocalDatabaseManager and `ModelCapsule` streams
+from a fake OpenAI-compatible server running in a thread. The synthetic corpus
+is seeded, so two runs on the same machine measure the same work. Results are
+written as JSON; pass a previous result as `--baseline` to fail on regressions.
+
+    python -m benchmarks.offline_suite --output cache/bench.json
+    python -m benchmarks.offline_suite --baseline cache/bench.json --tolerance 0.15
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import numpy as np
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from utils.fms import clean_and_chunk_text, extract_pages
+from utils.context import ContextBuilder
+from utils.localdb import LocalDatabaseManager
+from benchmarks.corpus import synthetic_corpus
+
+PROMPT_TEMPLATE = (
+    "Analyze the following documents to answer my questions in Mongolian:\n"
+    "{% for doc in documents %}Document index:{{ loop.index }}\n"
+    "Document content: {{ doc.content }}\n{% endfor %}"
+)
+
+
+class HashingEncoder:
+    """Deterministic stand-in for SentenceTransformerEncoder: normalized feature-hashed bag of words"""
+
+    def __init__(self, dimension: int = 256):
+        self.model_name = "hashing"
+        self.backend = "numpy"
+        self.dimension = dimension
+        self.signature = f"{self.model_name}|{self.backend}|{dimension}"
+
+    def encode(self, texts: List[str], task: Optional[str] = None) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                digest = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+                embeddings[i, digest % self.dimension] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        return [len(text.split()) for text in texts]
+
+    def close(self):
+        pass
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean())
+    }
+
+
+class FakeOpenAIServer:
+    """Minimal `/v1/chat/completions` endpoint that streams `tokens` SSE chunks"""
+
+    def __init__(self, tokens: int = 32, first_token_ms: float = 0.0, token_ms: float = 0.0):
+        settings = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                time.sleep(settings.first_token_ms / 1000)
+                for i in range(settings.tokens):
+                    chunk = {
+                        "id": "bench",
+                        "object": "chat.completion.chunk",
+                        "created": 0,
+                        "model": "bench",
+                        "choices": [{"index": 0, "delta": {"content": f"үг{i} "}, "finish_reason": None}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(settings.token_ms / 1000)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.tokens = tokens
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, name="fake-openai", daemon=True).start()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def best_of(repeats: int, run) -> float:
+    """Fastest of `repeats` timed runs, which filters out scheduler and allocator noise"""
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+
+def bench_chunking(texts: List[str], chunk_size: int, overlap: int, repeats: int) -> Dict[str, Any]:
+    def run():
+        chunks[:] = [
+            chunk for i, text in enumerate(texts)
+            for chunk in clean_and_chunk_text(text, f"doc-{i}.pdf", chunk_size, overlap)
+        ]
+
+    chunks: List[Dict[str, Any]] = []
+    elapsed = best_of(repeats, run)
+    size = sum(len(text.encode("utf-8")) for text in texts)
+    return {
+        "documents": len(texts),
+        "megabytes": size / 1e6,
+        "chunks": len(chunks),
+        "seconds": elapsed,
+        "megabytes_per_second": size / 1e6 / elapsed,
+        "chunks_per_second": len(chunks) / elapsed
+    }, chunks
+
+
+def bench_embedding(db: LocalDatabaseManager, chunks: List[Dict[str, Any]], batch_size: int, repeats: int) -> Dict[str, Any]:
+    def run():
+        db.cache.memory.clear()
+        for start in range(0, len(chunks), batch_size):
+            db.embed_texts([chunk["content"] for chunk in chunks[start:start + batch_size]])
+
+    elapsed = best_of(repeats, run)
+    return {"chunks": len(chunks), "seconds": elapsed, "chunks_per_second": len(chunks) / elapsed}
+
+
+def bench_insert(db: LocalDatabaseManager, chunks: List[Dict[str, Any]], batch_size: int, repeats: int) -> Dict[str, Any]:
+    """Cold inserts, embedding included, into a freshly recreated collection"""
+    timings = []
+    for _ in range(repeats):
+        db.run(lambda async_client: db.create_collect(async_client, recreate=True))
+        db.cache.memory.clear()
+        start_time = time.perf_counter()
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
+            db.run(lambda async_client: db.batch_insert(async_client, batch))
+        timings.append(time.perf_counter() - start_time)
+
+    inserted = sum(len(db.tenant_index(app_id).row_of) for app_id in db.tenants())
+    return {"inserted": inserted, "seconds": min(timings), "inserts_per_second": inserted / min(timings)}
+
+
+def bench_search(db: LocalDatabaseManager, queries: List[str], limit: int, distance: float) -> Dict[str, Any]:
+    for query in queries[:5]:
+        db.run(lambda async_client: db.search_database(async_client, query + " warmup", limit, distance))
+
+    latencies = []
+    for query in queries:
+        start_time = time.perf_counter()
+        db.run(lambda async_client: db.search_database(async_client, query, limit, distance))
+        latencies.append(time.perf_counter() - start_time)
+    return {"queries": len(queries), **percentiles(latencies), "queries_per_second": len(queries) / sum(latencies)}
+
+
+def bench_ttft(db: LocalDatabaseManager, queries: List[str], server: FakeOpenAIServer, limit: int, distance: float) -> Dict[str, Any]:
+    """Query -> retrieval -> prompt assembly -> first streamed token, as in one chat turn"""
+    # The provider clients refuse to construct without credentials; none are used
+    for variable in ("GENAI_API_KEY", "OPENAI_API_KEY", "EGUNE_API_KEY"):
+        os.environ.setdefault(variable, "offline-benchmark")
+    from openai import AsyncOpenAI
+    from src.models import ModelCapsule
+
+    model_id = "openai/gpt-4o-latest"
+    capsule = ModelCapsule()
+    capsule.openai_client = AsyncOpenAI(base_url=server.base_url, api_key="offline-benchmark")
+    builder = ContextBuilder()
+
+    async def turn(async_client, query: str):
+        start_time = time.perf_counter()
+        documents = await db.search_database(async_client, query, limit, distance)
+        system_prompt, messages, _ = builder.build(
+            model_id, PROMPT_TEMPLATE, [{"role": "user", "content": query}], documents or [],
+            capsule.metadata[model_id]["context_tokens"]
+        )
+        messages = [{"role": "system", "content": system_prompt}] + messages
+        first_token = None
+        tokens = 0
+        async for _ in capsule._stream_openai(model_id, messages):
+            if first_token is None:
+                first_token = time.perf_counter() - start_time
+            tokens += 1
+        return first_token, time.perf_counter() - start_time, tokens
+
+    ttft, totals = [], []
+    for query in queries:
+        first_token, total, _ = db.run(lambda async_client: turn(async_client, query))
+        ttft.append(first_token)
+        totals.append(total)
+    return {
+        "turns": len(queries),
+        **{f"ttft_{key}": value for key, value in percentiles(ttft).items()},
+        **{f"turn_{key}": value for key, value in percentiles(totals).items()}
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """Regressions beyond `tolerance`: throughputs that dropped or latencies that grew"""
+    regressions = []
+    for stage, metrics in results.items():
+        for metric, value in metrics.items():
+            previous = baseline.get(stage, {}).get(metric)
+            if not previous:
+                continue
+            if metric.endswith("per_second"):
+                change = previous / value - 1 if value else float("inf")
+            elif metric.endswith("_ms"):
+                change = value / previous - 1
+            else:
+                continue
+            marker = "REGRESSION" if change > tolerance else "ok"
+            print(f"{stage + '.' + metric:>36}: {previous:12.3f} -> {value:12.3f} ({-change if metric.endswith('per_second') else change:+.1%} {marker})")
+            if change > tolerance:
+                regressions.append(f"{stage}.{metric}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", nargs="*", default=[], help="Use these PDFs instead of the synthetic corpus")
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--words", type=int, default=5000, help="Words per synthetic document")
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--distance", type=float, default=0.8)
+    parser.add_argument("--llm-tokens", type=int, default=32)
+    parser.add_argument("--llm-first-token-ms", type=float, default=0.0, help="Simulated provider latency")
+    parser.add_argument("--llm-token-ms", type=float, default=0.0)
+    parser.add_argument("--repeats", type=int, default=3, help="Throughput stages report the fastest of this many runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="cache/bench.json")
+    parser.add_argument("--baseline", help="Earlier result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    if args.pdfs:
+        texts = ["\n".join(extract_pages(pdf)) for pdf in args.pdfs]
+    else:
+        texts = synthetic_corpus(args.documents, args.words, args.seed)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    results["chunking"], chunks = bench_chunking(texts, args.chunk_size, args.overlap, args.repeats)
+
+    random.seed(args.seed)
+    queries = [" ".join(chunk["content"].split()[:12]) for chunk in random.sample(chunks, min(args.queries, len(chunks)))]
+
+    with tempfile.TemporaryDirectory() as directory:
+        encoder = HashingEncoder(args.dimension)
+        # Fresh in-memory embedding caches and no retrieval cache, so every stage does its full work
+        settings = {"encoder": encoder, "cache_path": None, "retrieval_cache_size": 0}
+
+        embed_db = LocalDatabaseManager(os.path.join(directory, "embed"), **settings)
+        results["embedding"] = bench_embedding(embed_db, chunks, args.batch_size, args.repeats)
+        embed_db.connection.close()
+
+        db = LocalDatabaseManager(os.path.join(directory, "index"), **settings)
+        results["insert"] = bench_insert(db, chunks, args.batch_size, args.repeats)
+        results["search"] = bench_search(db, queries, args.limit, args.distance)
+
+        server = FakeOpenAIServer(args.llm_tokens, args.llm_first_token_ms, args.llm_token_ms)
+        try:
+            results["end_to_end"] = bench_ttft(db, queries[:50], server, args.limit, args.distance)
+        finally:
+            server.close()
+            db.connection.close()
+
+    report = {
+        "revision": git_revision(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": vars(args),
+        "results": results
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,30 @@
 import os
 import yaml
-import asyncio
 import streamlit as st
-import weaviate
-from jinja2 import Template
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from models import ModelCapsule
-from pdfminer.high_level import extract_text
-from utils.fms import clean_and_chunk_text
-from utils.dbms import WeaviateDatabaseManager
+from utils.fms import DEFAULT_APP_ID, extract_pages, stream_chunks
+from utils.dbms import TENANT_NAME, WeaviateDatabaseManager
+from utils.localdb import LocalDatabaseManager
+from utils.context import ContextBuilder
+from utils.metrics import tracer
 
 @st.cache_resource
 def get_db_manager():
-    db = WeaviateDatabaseManager()
+    if os.getenv("VECTOR_STORE", "weaviate") == "local":
+        db = LocalDatabaseManager()
+    else:
+        db = WeaviateDatabaseManager()
     return db
 
 db = get_db_manager()
 
-async def insert_document_into_db(chunks):
-    async with weaviate.use_async_with_local() as async_client:
-        results = await db.batch_insert(async_client, chunks)
-        return results
+def insert_document_into_db(chunks):
+    return db.run(lambda async_client: db.stream_insert(async_client, chunks))
     
-async def query_database(query_text: str, distance: float):
-    async with weaviate.use_async_with_local() as async_client:
-        return await db.search_database(async_client, query_text, 5, distance)
+def query_database(query_text: str, distance: float, app_id: str = DEFAULT_APP_ID):
+    return db.run(lambda async_client: db.search_database(async_client, query_text, 5, distance, app_id))
 
 @st.cache_resource
 def read_capsule():
@@ -40,10 +39,23 @@ def read_prompts():
     except Exception as e:
         print(f"Error occured: {str(e)}")
 
+@st.cache_resource
+def get_context_builder():
+    return ContextBuilder()
+
+@st.cache_resource
+def start_metrics_server():
+    # Prometheus-style /metrics endpoint, opt-in through METRICS_PORT
+    if os.getenv("METRICS_PORT"):
+        return tracer.serve(int(os.getenv("METRICS_PORT")))
+
+start_metrics_server()
+
 if not "prompt" in st.session_state:
     read_prompts()
 
 capsule = read_capsule()
+context_builder = get_context_builder()
 
 decoder_models = capsule.model_labels
 encoder_models = ["Jina/Jina-v3-embedding"]
@@ -62,6 +74,7 @@ def update_prompt():
             st.session_state.prompt[model]["prompt"] = prompt_updated
             with open(f"configurations/prompts.yml", "w") as f:
                 yaml.dump(st.session_state.prompt, f)
+            context_builder.invalidate(model)
         
         st.rerun()
 
@@ -79,6 +92,7 @@ if st.sidebar.button("✨ Шинэ чат үүсгэх", use_container_width=Tru
 
 st.sidebar.selectbox("Хэлний загвар сонгох (LLM)", decoder_models, key="cfg_model")
 st.sidebar.slider("Температур", 0.0, 1.0, value=0.25, key="cfg_temperature")
+st.sidebar.checkbox("Нөөц загвараар хурдасгах (hedging)", value=False, key="cfg_hedge")
 if st.sidebar.button("Системийн промпт тохируулах", use_container_width=True):
     update_prompt()
 
@@ -90,15 +104,18 @@ if st.session_state.cfg_tool_use:
     st.sidebar.selectbox("Асуулт эмбедлэх загвар (SBERT)", encoder_models)
     st.sidebar.checkbox("Асуултаа эмбедлэх", value=True, disabled=True)
     st.sidebar.slider("Вектор хайлтын радиус", 0.0, 1.0, value=0.25, key="radius")
+    st.sidebar.text_input("Аппликейшн (app_id)", value=DEFAULT_APP_ID, key="cfg_app_id")
+    app_id_valid = TENANT_NAME.match(st.session_state.cfg_app_id) is not None
+    if not app_id_valid:
+        st.sidebar.error("app_id нь 1-64 латин үсэг, тоо, '-' эсвэл '_' тэмдэгтээс бүрдэнэ.")
     uploaded_file = st.sidebar.file_uploader("PDF оруулах", type="pdf")
 
     if uploaded_file is not None:
-        if st.sidebar.button("Боловсруулах...", use_container_width=True):
+        if st.sidebar.button("Боловсруулах...", use_container_width=True, disabled=not app_id_valid):
             with st.spinner("Файлыг өгөгдлийн санд оруулж байна..."):
-                text = extract_text(uploaded_file)
-                batch_chunks = clean_and_chunk_text(text, uploaded_file.name)
-                results = asyncio.run(insert_document_into_db(batch_chunks))
-                st.success(f"Вектор өгөгдлийн санд {len(results._all_responses)} документ бичигдлээ.\nХугацаа (s): {results.elapsed_seconds}")
+                chunks = stream_chunks(extract_pages(uploaded_file), uploaded_file.name, app_id=st.session_state.cfg_app_id)
+                results = insert_document_into_db(chunks)
+                st.success(f"Вектор өгөгдлийн санд {results['inserted']} документ бичигдлээ.\nХугацаа (s): {results['elapsed_seconds']:.2f}")
 
 st.sidebar.divider()
 st.sidebar.write("© 2025 Эгүнэ AI.")
@@ -123,39 +140,49 @@ if user_input := st.chat_input("Юу асуумаар байна?", disabled=st.
     with st.chat_message("user"):
         st.markdown(user_input)
     
-    current_model_id = st.session_state.cfg_model
-    messages = st.session_state.messages
-
-    system_prompt_template = st.session_state.prompt[current_model_id]["prompt"]
-    template = Template(system_prompt_template)
-
-    search_results = []
-
-    with st.spinner("Вектор сангаас хайж байна...", show_time=True):
-        search_radius = float(st.session_state["radius"])
-        search_results = asyncio.run(query_database(user_input, search_radius))
-        with st.expander("Хайлтын илэрцийг харах"):
-            for i, result in enumerate(search_results):
-                st.write(f"Докумэнт: {i + 1}")
-                st.write(f"Агуулга: {result["content"]}")
-                st.write(f"Аппликейшн: {result["app_id"]}")
-                st.write(f"Евклидийн зай: {result["distance"]}")
-                st.write(f"\n")
-
-    system_prompt = template.render(documents=search_results)
-
-    with st.spinner("Хэлний загвар бодож байна...", show_time=True):
-        with st.chat_message("assistant"):
-            if current_model_id.split('/')[0] == "google":
-                response = st.write_stream(capsule._generate_genai(current_model_id, messages[-1]["content"], system_prompt))
-            else:
-                messages = [{"role": "system", "content": system_prompt}] + messages
-                response = st.write_stream(capsule._generate_openai(current_model_id, messages))
+    # Logs the hottest stacks of turns slower than PROFILE_SLOW_MS
+    with tracer.profile("chat_turn"):
+        current_model_id = st.session_state.cfg_model
+        temperature = st.session_state.cfg_temperature
+        messages = st.session_state.messages
+
+        system_prompt_template = st.session_state.prompt[current_model_id]["prompt"]
+
+        search_results = []
+
+        with st.spinner("Вектор сангаас хайж байна...", show_time=True):
+            search_radius = float(st.session_state["radius"])
+            search_results = query_database(user_input, search_radius, st.session_state.cfg_app_id) or []
+            with st.expander("Хайлтын илэрцийг харах"):
+                for i, result in enumerate(search_results):
+                    st.write(f"Докумэнт: {i + 1}")
+                    st.write(f"Агуулга: {result["content"]}")
+                    st.write(f"Аппликейшн: {result["app_id"]}")
+                    st.write(f"Евклидийн зай: {result["distance"]}")
+                    st.write(f"\n")
+
+        system_prompt, messages, context_report = context_builder.build(
+            current_model_id,
+            system_prompt_template,
+            messages,
+            search_results,
+            capsule.metadata[current_model_id]["context_tokens"]
+        )
+
+        with st.spinner("Хэлний загвар бодож байна...", show_time=True):
+            with st.chat_message("assistant"):
+                if st.session_state.cfg_hedge:
+                    response = st.write_stream(capsule.generate_hedged(current_model_id, messages, system_prompt, temperature))
+                elif current_model_id.split('/')[0] == "google":
+                    response = st.write_stream(capsule._generate_genai(current_model_id, messages, system_prompt, temperature))
+                else:
+                    messages = [{"role": "system", "content": system_prompt}] + messages
+                    response = st.write_stream(capsule._generate_openai(current_model_id, messages, temperature))
         
-        st.session_state.messages.append({
-            "role": "assistant",
-            "content": response
-        })
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": response
+            })
 
     st.session_state.generating = False
     st.rerun()
@@ -1,59 +1,86 @@
 import os
+import time
+import asyncio
+import logging
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from google import genai
 from google.genai import types
+from utils.cache import ResponseCache
+from utils.context import estimate_tokens
+from utils.metrics import tracer
 
 load_dotenv()
 
+logger = logging.getLogger()
+
 class ModelCapsule:
     
-    def __init__(self) -> None:
+    def __init__(
+            self,
+            response_cache_size: int = int(os.getenv("LLM_RESPONSE_CACHE_SIZE", 0)),
+            response_cache_ttl: float = float(os.getenv("LLM_RESPONSE_CACHE_TTL", 3600)),
+            max_history_messages: int = int(os.getenv("LLM_MAX_HISTORY_MESSAGES", 20)),
+            hedge_delay: float = float(os.getenv("LLM_HEDGE_DELAY", 3.0))) -> None:
         self.metadata: Dict[str, Dict[str, Any]] = {
             "google/gemini-2.5-flash" : {
                 "model_class": "genai",
                 "model_label": "gemini-2.5-flash",
                 "api_key": os.getenv("GEMINI_API_KEY"),
-                "timeout": 60
+                "timeout": 60,
+                "context_tokens": 32000,
+                "fallbacks": ["google/gemini-2.5-flash-lite", "openai/gpt-4o-latest"]
             },
             "google/gemini-2.5-flash-lite" : {
                 "model_class": "genai",
                 "model_label": "gemini-2.5-flash-lite",
                 "api_key": os.getenv("GEMINI_API_KEY"),
-                "timeout": 30
+                "timeout": 30,
+                "context_tokens": 16000,
+                "fallbacks": ["google/gemini-2.5-flash"]
             },
             "google/gemini-2.5-pro" : {
                 "model_class": "genai",
                 "model_label": "gemini-2.5-pro",
                 "api_key": os.getenv("GEMINI_API_KEY"),
-                "timeout": 120
+                "timeout": 120,
+                "context_tokens": 64000,
+                "fallbacks": ["google/gemini-2.5-flash"]
             },
             "chimege/chat-egune-v0.5" : {
                 "model_class": "chimege",
                 "model_label": "egune",
                 "api_key": os.getenv("EGUNE_API_KEY"),
                 "base_url": os.getenv("EGUNE_BASE_URL"),
-                "timeout": 90
+                "timeout": 90,
+                "context_tokens": 8000,
+                "fallbacks": ["google/gemini-2.5-flash"]
             },
             "openai/gpt-4o-latest": {
                 "model_class": "openai",
                 "model_label": "chatgpt-4o-latest",
                 "api_key": os.getenv("OPENAI_API_KEY"),
-                "timeout": 120
+                "timeout": 120,
+                "context_tokens": 32000,
+                "fallbacks": ["google/gemini-2.5-flash"]
             },
             "openai/o1-mini" : {
                 "model_class": "openai",
                 "model_label": "o1-mini",
                 "api_key": os.getenv("OPENAI_API_KEY"),
-                "timeout": 120
+                "timeout": 120,
+                "context_tokens": 32000,
+                "fallbacks": ["openai/o3-mini"]
             },
             "openai/o3-mini" : {
                 "model_class": "openai",
                 "model_label": "o3-mini",
                 "api_key": os.getenv("OPENAI_API_KEY"),
-                "timeout": 120
+                "timeout": 120,
+                "context_tokens": 32000,
+                "fallbacks": ["openai/o1-mini"]
             }
         }
 
@@ -62,50 +89,318 @@ class ModelCapsule:
         self.egune_client = AsyncOpenAI(base_url=os.getenv("EGUNE_BASE_URL"),
                                         api_key=os.getenv("EGUNE_API_KEY"))
         
-        self.genai_chats = {}
+        self.max_history_messages = max_history_messages
+        self.hedge_delay = hedge_delay
+        self.latency = LatencyTracker()
+
+        # Opt-in: replay identical requests instead of calling the provider again
+        self.response_cache = ResponseCache(response_cache_size, response_cache_ttl) if response_cache_size > 0 else None
         
 
     @property
     def model_labels(self) -> List[str]:
         return self.metadata.keys()
     
-    async def _generate_genai(self, model_id: str, user_message: str, system_prompt: str):
-        try:
-            if model_id not in self.genai_chats:
-                chat = self.genai_client.chats.create(model=self.metadata[model_id]["model_label"])
-                self.genai_chats[model_id] = chat
+    async def _replay(self, chunks: List[str]):
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(0)
+
+    def _genai_contents(self, messages: List[Dict[str, Any]]) -> List[types.Content]:
+        """Convert the most recent chat turns of a session into Gemini contents"""
+        recent = messages[-self.max_history_messages:]
+        # Gemini expects the conversation to open with a user turn
+        while recent and recent[0]["role"] != "user":
+            recent = recent[1:]
 
-            response = self.genai_chats[model_id].send_message_stream(user_message, config=types.GenerateContentConfig(
-                system_instruction=system_prompt
-            ))
+        return [
+            types.Content(
+                role="model" if message["role"] == "assistant" else "user",
+                parts=[types.Part(text=message["content"])]
+            )
+            for message in recent
+        ]
 
-            for chunk in response:
-                if chunk.text:
-                    yield chunk.text
+    def _record_first_token(self, model_id: str, start_time: float) -> float:
+        first_token_time = time.perf_counter()
+        tracer.observe("llm_ttft_seconds", first_token_time - start_time, model=model_id)
+        return first_token_time
 
-        except Exception as e:
-            print(f"Error generating tokens (GenAI): {e}")
-            yield f"Error: {e}"
+    def _record_throughput(self, model_id: str, chunks: List[str], first_token_time: float):
+        generation_seconds = time.perf_counter() - first_token_time
+        tokens = sum(estimate_tokens(chunk) for chunk in chunks)
+        if generation_seconds > 0:
+            tracer.observe("llm_tokens_per_second", tokens / generation_seconds, model=model_id)
+        tracer.observe("llm_generation_seconds", generation_seconds, model=model_id)
+
+    async def _stream_genai(
+            self, 
+            model_id: str, 
+            messages: List[Dict[str, Any]], 
+            system_prompt: str, 
+            temperature: Optional[float] = None):
+        """
+        Stream a Gemini response through the SDK's async client.
+
+        `messages` is the caller's own chat history (per Streamlit session), so no chat
+        state is shared between users; only the last `max_history_messages` turns are
+        sent, which keeps the payload per turn flat as a conversation grows.
+        """
+        contents = self._genai_contents(messages)
+
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = ResponseCache.key(
+                model_id,
+                system_prompt,
+                [content.model_dump(mode="json", exclude_none=True) for content in contents],
+                temperature
+            )
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                async for chunk in self._replay(cached):
+                    yield chunk
+                return
+
+        start_time = time.perf_counter()
+        response = await self.genai_client.aio.models.generate_content_stream(
+            model=self.metadata[model_id]["model_label"],
+            contents=contents,
+            config=types.GenerateContentConfig(
+                system_instruction=system_prompt,
+                temperature=temperature
+            )
+        )
+
+        chunks = []
+        async for chunk in response:
+            if chunk.text:
+                if not chunks:
+                    first_token_time = self._record_first_token(model_id, start_time)
+                chunks.append(chunk.text)
+                yield chunk.text
 
-    async def _generate_openai(self, model_id: str, messages: List[Dict[str, Any]]):
+        if chunks:
+            self._record_throughput(model_id, chunks, first_token_time)
+            # An empty stream is not an answer worth replaying
+            if cache_key is not None:
+                self.response_cache.put(cache_key, chunks)
+
+    async def _stream_openai(self, model_id: str, messages: List[Dict[str, Any]], temperature: Optional[float] = None):
         if self.metadata[model_id]["model_class"] == "chimege":
             tmp_client = self.egune_client
         
         else:
             tmp_client = self.openai_client
 
-        try:
-            stream = await tmp_client.chat.completions.create(
-                model=self.metadata[model_id]["model_label"],
-                messages=messages,
-                stream=True,
-                timeout=self.metadata[model_id]["timeout"]
-            )
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = ResponseCache.key(model_id, None, messages, temperature)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                async for chunk in self._replay(cached):
+                    yield chunk
+                return
+
+        sampling = {"temperature": temperature} if temperature is not None else {}
+        start_time = time.perf_counter()
+        stream = await tmp_client.chat.completions.create(
+            model=self.metadata[model_id]["model_label"],
+            messages=messages,
+            stream=True,
+            timeout=self.metadata[model_id]["timeout"],
+            **sampling
+        )
 
+        chunks = []
+        try:
             async for chunk in stream:
                 if chunk and chunk.choices and chunk.choices[0].delta.content:
+                    if not chunks:
+                        first_token_time = self._record_first_token(model_id, start_time)
+                    chunks.append(chunk.choices[0].delta.content)
                     yield chunk.choices[0].delta.content
+        finally:
+            # Releases the HTTP connection when a hedged loser is cancelled
+            await stream.close()
+
+        if chunks:
+            self._record_throughput(model_id, chunks, first_token_time)
+            # An empty stream is not an answer worth replaying
+            if cache_key is not None:
+                self.response_cache.put(cache_key, chunks)
+
+    async def _generate_genai(
+            self, 
+            model_id: str, 
+            messages: List[Dict[str, Any]], 
+            system_prompt: str, 
+            temperature: Optional[float] = None):
+        try:
+            async for chunk in self._stream_genai(model_id, messages, system_prompt, temperature):
+                yield chunk
+
+        except Exception as e:
+            print(f"Error generating tokens (GenAI): {e}")
+            yield f"Error: {e}"
+
+    async def _generate_openai(self, model_id: str, messages: List[Dict[str, Any]], temperature: Optional[float] = None):
+        try:
+            async for chunk in self._stream_openai(model_id, messages, temperature):
+                yield chunk
         
         except Exception as e:
             print(f"Error generating tokens (OpenAI): {e}")
-            yield f"Error: {e}"
\ No newline at end of file
+            yield f"Error: {e}"
+
+    async def _timed_stream(
+            self,
+            model_id: str,
+            messages: List[Dict[str, Any]],
+            system_prompt: str,
+            temperature: Optional[float] = None):
+        """Provider-agnostic stream that feeds time-to-first-token into the latency tracker"""
+        if self.metadata[model_id]["model_class"] == "genai":
+            stream = self._stream_genai(model_id, messages, system_prompt, temperature)
+        else:
+            stream = self._stream_openai(model_id, [{"role": "system", "content": system_prompt}] + messages, temperature)
+
+        start_time = time.perf_counter()
+        first = True
+        try:
+            async for chunk in stream:
+                if first:
+                    self.latency.observe(model_id, time.perf_counter() - start_time)
+                    first = False
+                yield chunk
+        except asyncio.CancelledError:
+            if first:
+                # Lost a hedge race: it took at least this long, which is all we learn
+                self.latency.observe(model_id, time.perf_counter() - start_time)
+            raise
+        except Exception:
+            if first:
+                # A failed provider counts as if it had hit its timeout
+                self.latency.observe(model_id, self.metadata[model_id]["timeout"])
+            raise
+        finally:
+            await stream.aclose()
+
+    async def generate_hedged(
+            self,
+            model_id: str,
+            messages: List[Dict[str, Any]],
+            system_prompt: str,
+            temperature: Optional[float] = None,
+            hedge_delay: Optional[float] = None):
+        """
+        Stream from whichever of `model_id` and its configured fallbacks produces a token first.
+
+        Candidates are ranked by their time-to-first-token EWMA. The first one starts
+        immediately; whenever no token has arrived within `hedge_delay` seconds (or a
+        candidate fails) the next one is fired with the same request. The first
+        candidate to yield a token wins and every other request is cancelled. Failures
+        are yielded as "Error: ..." text, like the single-provider generators.
+        """
+        hedge_delay = self.hedge_delay if hedge_delay is None else hedge_delay
+        candidates = self.latency.rank([model_id] + self.metadata[model_id].get("fallbacks", []))
+        waiting = list(candidates)
+        running: Dict[asyncio.Task, Any] = {}
+
+        def launch():
+            candidate = waiting.pop(0)
+            stream = self._timed_stream(candidate, messages, system_prompt, temperature)
+            running[asyncio.ensure_future(stream.__anext__())] = (candidate, stream)
+
+        async def cancel(tasks):
+            for task in tasks:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await running.pop(task)[1].aclose()
+
+        launch()
+        errors = []
+        winner = None
+        try:
+            while winner is None:
+                done, _ = await asyncio.wait(
+                    running.keys(),
+                    timeout=hedge_delay if waiting else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    launch()
+                    continue
+
+                for task in done:
+                    candidate, stream = running.pop(task)
+                    if task.exception() is None:
+                        winner = (candidate, stream, task.result())
+                        break
+                    errors.append(f"{candidate}: {task.exception()!r}")
+                    await stream.aclose()
+
+                if winner is None and not running:
+                    if not waiting:
+                        break
+                    launch()
+        finally:
+            await cancel(list(running.keys()))
+
+        if winner is None:
+            print(f"Error generating tokens (hedged): {'; '.join(errors)}")
+            yield f"Error: All hedged candidates failed: {'; '.join(errors)}"
+            return
+
+        candidate, stream, first_chunk = winner
+        if candidate != model_id:
+            logger.info(f"Hedged generation served by {candidate} instead of {model_id}")
+
+        try:
+            yield first_chunk
+            async for chunk in stream:
+                yield chunk
+        except Exception as e:
+            print(f"Error generating tokens ({candidate}): {e}")
+            yield f"Error: {e}"
+        finally:
+            await stream.aclose()
+
+
+class LatencyTracker:
+    """
+    Exponentially weighted moving average of time-to-first-token per model.
+
+    A model that is ranked behind a faster one is rarely started, so its estimate is
+    not refreshed. Estimates older than `max_age` seconds are therefore forgotten, and
+    the requested model gets its first slot back and is measured again.
+    """
+
+    def __init__(self, alpha: float = 0.2, max_age: float = float(os.getenv("LLM_LATENCY_MAX_AGE", 60.0))):
+        self.alpha = alpha
+        self.max_age = max_age
+        self.ewma: Dict[str, float] = {}
+        self.updated: Dict[str, float] = {}
+
+    def observe(self, model_id: str, seconds: float):
+        previous = self.ewma.get(model_id)
+        self.ewma[model_id] = seconds if previous is None else self.alpha * seconds + (1 - self.alpha) * previous
+        self.updated[model_id] = time.monotonic()
+
+    def expire(self):
+        now = time.monotonic()
+        for model_id, updated in list(self.updated.items()):
+            if now - updated > self.max_age:
+                self.ewma.pop(model_id, None)
+                self.updated.pop(model_id, None)
+
+    def rank(self, candidates: List[str]) -> List[str]:
+        """
+        Order candidates by EWMA. The requested model (first candidate) keeps its slot
+        until measured; unmeasured fallbacks go last in their configured order.
+        """
+        self.expire()
+        return sorted(
+            candidates,
+            key=lambda model_id: (model_id not in self.ewma and model_id != candidates[0], self.ewma.get(model_id, 0.0))
+        )
@@ -0,0 +1,68 @@
+import time
+import threading
+
+from concurrent.futures import CancelledError
+
+import pytest
+
+from utils.batching import MicroBatcher
+
+
+def test_cancelled_future_does_not_stop_the_worker():
+    release = threading.Event()
+
+    def batch_fn(items):
+        release.wait(5)
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=1)
+    running = batcher.submit(1)
+    time.sleep(0.05)  # the worker is now blocked inside batch_fn
+    cancelled = batcher.submit(2)
+    queued = batcher.submit(3)
+    assert cancelled.cancel()
+    release.set()
+
+    assert running.result(timeout=5) == 2
+    assert queued.result(timeout=5) == 6
+    with pytest.raises(CancelledError):
+        cancelled.result(timeout=0)
+    assert batcher.worker.is_alive()
+    assert batcher.submit(4).result(timeout=5) == 8
+
+
+def test_failed_batch_reaches_every_caller_and_the_worker_survives():
+    def batch_fn(items):
+        if "bad" in items:
+            raise ValueError("boom")
+        return items
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=1)
+    with pytest.raises(ValueError):
+        batcher.submit("bad").result(timeout=5)
+    assert batcher.submit("good").result(timeout=5) == "good"
+    assert batcher.worker.is_alive()
+
+
+def test_lone_request_is_not_held_for_max_wait():
+    batcher = MicroBatcher(lambda items: items, max_batch_size=8, max_wait_ms=1000)
+    start_time = time.perf_counter()
+    assert batcher.submit("only").result(timeout=5) == "only"
+    assert time.perf_counter() - start_time < 0.5
+
+
+def test_concurrent_requests_share_a_batch():
+    release = threading.Event()
+
+    def batch_fn(items):
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=50)
+    first = batcher.submit(0)
+    time.sleep(0.05)
+    rest = [batcher.submit(i) for i in range(1, 5)]
+    release.set()
+
+    assert [future.result(timeout=5) for future in [first] + rest] == list(range(5))
+    assert batcher.stats["batch_size_histogram"] == {1: 1, 4: 1}
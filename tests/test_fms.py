@@ -0,0 +1,66 @@
+from utils.fms import chunk_id, clean_and_chunk_text, stream_chunks
+from utils.context import estimate_tokens
+
+
+PAGES = [
+    "Нэмэгдсэн өртгийн албан татвар нь хэрэглээнд ногдуулдаг татвар юм. Энэ татварыг үйлдвэрлэгч төлдөг.\n\n"
+    "Хоёр жилийн өмнө иргэд энэ санаачилгыг дэмжсэн. Шинэ журам",
+    "ирэх оноос хэрэгжинэ. Өргөдлийг цахимаар хүлээн авна! Хариуг ажлын таван өдөрт өгнө.",
+    "Төгсгөлийн өгүүлбэр цэггүй"
+]
+
+
+def normalized(text: str) -> str:
+    return " ".join(text.split())
+
+
+def test_offsets_point_at_the_chunk_text():
+    document = "\n".join(PAGES)
+    chunks = list(stream_chunks(PAGES, "doc.pdf", chunk_size=12, overlap=4))
+    assert len(chunks) > 2
+    for chunk in chunks:
+        metadata = chunk["metadata"]
+        assert chunk["offset"] == metadata["start"]
+        assert normalized(document[metadata["start"]:metadata["end"]]) == chunk["content"]
+        assert metadata["size"] == len(chunk["content"].split()) <= 12
+
+
+def test_page_breaks_do_not_join_words():
+    chunks = list(stream_chunks(["abc def", "ghi jkl."], "doc.pdf"))
+    assert [chunk["content"] for chunk in chunks] == ["abc def ghi jkl."]
+    assert chunks[0]["metadata"] == {"start": 0, "end": 16, "size": 4}
+
+
+def test_sentences_overlap_between_chunks():
+    text = " ".join(f"Өгүүлбэр {i} энд байна." for i in range(40))
+    chunks = clean_and_chunk_text(text, "doc.pdf", chunk_size=20, overlap=8)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current["metadata"]["start"] < previous["metadata"]["end"]
+        assert current["content"].split(".")[0] + "." in previous["content"]
+
+
+def test_unpunctuated_text_still_overlaps():
+    words = [f"w{i}" for i in range(1000)]
+    chunks = clean_and_chunk_text(" ".join(words), "doc.pdf", chunk_size=200, overlap=50)
+    assert len(chunks) == 7
+    assert " ".join(chunks[-1]["content"].split()[-1:]) == "w999"
+    for previous, current in zip(chunks, chunks[1:]):
+        shared = set(previous["content"].split()) & set(current["content"].split())
+        assert len(shared) == 50
+        assert current["metadata"]["size"] <= 200
+
+
+def test_token_mode_respects_chunk_size():
+    text = " ".join(["урт"] * 600)
+    chunks = clean_and_chunk_text(text, "doc.pdf", chunk_size=120, overlap=30, count_tokens=estimate_tokens)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk["metadata"]["size"] <= 120
+
+
+def test_chunk_ids_are_deterministic_and_include_app_id():
+    first = list(stream_chunks(PAGES, "doc.pdf", chunk_size=12, overlap=4, app_id="app-a"))
+    second = list(stream_chunks(PAGES, "doc.pdf", chunk_size=12, overlap=4, app_id="app-a"))
+    assert [chunk_id(chunk) for chunk in first] == [chunk_id(chunk) for chunk in second]
+    assert len({chunk_id(chunk) for chunk in first}) == len(first)
+    assert {chunk["app_id"] for chunk in first} == {"app-a"}
@@ -0,0 +1,102 @@
+import time
+import queue
+import logging
+import threading
+
+from collections import Counter
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger()
+
+class MicroBatcher:
+    """
+    Collects single-item requests from concurrent callers and runs them through
+    `batch_fn` together.
+
+    A request that arrives while the worker is idle and nothing else is queued is
+    run at once. Otherwise a batch is flushed once it holds `max_batch_size` items or
+    `max_wait_ms` after its first item arrived, whichever comes first. Callers get a
+    concurrent future, so both threads and event loops (via `asyncio.wrap_future`)
+    can wait on it; cancelled futures are dropped from their batch.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self.queue: queue.Queue = queue.Queue()
+        self.batch_sizes: Counter = Counter()
+        self.queue_depths: Counter = Counter()
+        self.lock = threading.Lock()
+
+        self.worker = threading.Thread(target=self._work, name="micro-batcher", daemon=True)
+        self.worker.start()
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        depth = self.queue.qsize()
+        with self.lock:
+            # Power-of-two buckets keep the histogram small under heavy load
+            self.queue_depths[1 << (depth.bit_length() - 1) if depth else 0] += 1
+        self.queue.put((item, future))
+        return future
+
+    def _work(self):
+        while True:
+            batch = [self.queue.get()]
+            # Waiting for company only pays off under load, a lone request goes straight through
+            deadline = time.monotonic() + (self.max_wait if not self.queue.empty() else 0)
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Callers that gave up (e.g. a cancelled `asyncio.wrap_future`) are not computed
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            with self.lock:
+                self.batch_sizes[len(batch)] += 1
+
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+            except Exception as e:
+                logger.info(f"Micro-batch of {len(batch)} items failed: {e}")
+                for _, future in batch:
+                    self._settle(future, exception=e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                self._settle(future, result)
+
+    @staticmethod
+    def _settle(future: Future, result: Any = None, exception: Optional[BaseException] = None):
+        # A future that is already resolved must never take the worker thread down with it
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            logger.info("Micro-batch result dropped, its future was already resolved.")
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            batches = sum(self.batch_sizes.values())
+            items = sum(size * count for size, count in self.batch_sizes.items())
+            return {
+                "batches": batches,
+                "items": items,
+                "mean_batch_size": items / batches if batches else 0.0,
+                "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+                "queue_depth_histogram": dict(sorted(self.queue_depths.items()))
+            }
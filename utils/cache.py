@@ -0,0 +1,288 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+
+from collections import OrderedDict
+from typing import Any, List, Dict, Optional, Tuple
+
+logger = logging.getLogger()
+
+class EmbeddingCache:
+    """
+    Two-tier, content-addressed cache for embedding vectors.
+
+    Vectors are keyed by a hash of (model name, task, normalized text). The
+    first tier is an in-memory LRU bounded by `max_entries`, the second one is
+    a SQLite table of float32 blobs that survives restarts.
+    """
+
+    def __init__(self, model_name: str, path: Optional[str] = None, max_entries: int = 50000):
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+
+        self.memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.connection = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self.connection.commit()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Collapse whitespace so trivially different copies share an entry"""
+        return re.sub(r'\s+', ' ', text).strip()
+
+    def key(self, text: str, task: Optional[str] = None) -> str:
+        payload = f"{self.model_name}\x00{task or ''}\x00{self.normalize(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Look up vectors for the given keys, memory tier first then disk"""
+        found: Dict[str, np.ndarray] = {}
+        remaining = []
+
+        with self.lock:
+            for key in keys:
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    found[key] = self.memory[key]
+                else:
+                    remaining.append(key)
+
+            if remaining and self.connection is not None:
+                # SQLite caps the number of bound parameters per statement.
+                for start in range(0, len(remaining), 500):
+                    window = remaining[start:start + 500]
+                    placeholders = ",".join("?" * len(window))
+                    rows = self.connection.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", window
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[key] = vector
+                        self._remember(key, vector)
+                        self.disk_hits += 1
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def put_many(self, items: List[Tuple[str, np.ndarray]]):
+        """Store freshly computed vectors in both tiers"""
+        with self.lock:
+            for key, vector in items:
+                self._remember(key, np.asarray(vector, dtype=np.float32))
+
+            if self.connection is not None and items:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+                )
+                self.connection.commit()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory)
+        }
+
+
+class RetrievalCache:
+    """
+    Cache of search results in front of `search_database`.
+
+    Entries are keyed by (tenant, normalized query text, limit, distance threshold).
+    When `epsilon` is positive a query whose embedding lies within `epsilon` cosine
+    distance of a cached query of the same tenant with the same limit and threshold
+    reuses its results too. Every write to the collection bumps `version`, which invalidates all older
+    entries; `ttl` bounds staleness from writers in other processes.
+    """
+
+    def __init__(self, max_entries: int = 1024, epsilon: float = 0.0, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.epsilon = epsilon
+        self.ttl = ttl
+
+        self.entries: OrderedDict[Tuple[Optional[str], str, int, float], Dict[str, Any]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.version = 0
+        self.hits = 0
+        self.approximate_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def bump(self):
+        """Invalidate every cached result, called after each write to the collection"""
+        with self.lock:
+            self.version += 1
+            self.entries.clear()
+
+    def _fresh(self, entry: Dict[str, Any]) -> bool:
+        return entry["version"] == self.version and time.monotonic() - entry["created"] < self.ttl
+
+    def get(
+            self,
+            query_text: str,
+            limit: int,
+            distance_threshold: float,
+            app_id: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        key = (app_id, EmbeddingCache.normalize(query_text), limit, distance_threshold)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or not self._fresh(entry):
+                self.entries.pop(key, None)
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry["embed_seconds"] + entry["search_seconds"]
+            return entry["results"]
+
+    def get_similar(
+            self,
+            query_vector: List[float],
+            limit: int,
+            distance_threshold: float,
+            app_id: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """Results of the closest cached query within `epsilon`, or None (and a counted miss)"""
+        with self.lock:
+            candidates = [
+                (key, entry) for key, entry in self.entries.items()
+                if key[0] == app_id and key[2] == limit and key[3] == distance_threshold and self._fresh(entry)
+            ] if self.epsilon > 0 else []
+            if candidates:
+                vectors = np.stack([entry["vector"] for _, entry in candidates])
+                distances = 1.0 - vectors @ np.asarray(query_vector, dtype=np.float32)
+                best = int(np.argmin(distances))
+                if distances[best] <= self.epsilon:
+                    key, entry = candidates[best]
+                    self.entries.move_to_end(key)
+                    self.approximate_hits += 1
+                    self.saved_seconds += entry["search_seconds"]
+                    return entry["results"]
+
+            self.misses += 1
+            return None
+
+    def put(
+            self,
+            query_text: str,
+            limit: int,
+            distance_threshold: float,
+            query_vector: List[float],
+            results: List[Dict[str, Any]],
+            embed_seconds: float,
+            search_seconds: float,
+            version: int,
+            app_id: Optional[str] = None):
+        """Store results computed against collection `version`, dropped if a write happened meanwhile"""
+        key = (app_id, EmbeddingCache.normalize(query_text), limit, distance_threshold)
+        with self.lock:
+            if version != self.version:
+                return
+            self.entries[key] = {
+                "version": version,
+                "created": time.monotonic(),
+                "vector": np.asarray(query_vector, dtype=np.float32),
+                "results": results,
+                "embed_seconds": embed_seconds,
+                "search_seconds": search_seconds
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.approximate_hits + self.misses
+        return {
+            "hits": self.hits,
+            "approximate_hits": self.approximate_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.approximate_hits) / lookups if lookups else 0.0,
+            "saved_seconds": self.saved_seconds
+        }
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache of complete streamed LLM responses, keyed by a hash of
+    everything that determines the output: model, system prompt, messages and
+    sampling temperature.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self.entries: OrderedDict[str, Tuple[float, List[str]]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model_id: str, system_prompt: Optional[str], messages: List[Any], temperature: Optional[float]) -> str:
+        payload = json.dumps(
+            [model_id, system_prompt, messages, temperature],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, chunks: List[str]):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), list(chunks))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries)
+        }
@@ -0,0 +1,134 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import weaviate
+
+from urllib.parse import urlparse
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Coroutine, Optional, TypeVar
+from weaviate import WeaviateAsyncClient
+from weaviate.classes.init import AdditionalConfig, Timeout
+from weaviate.config import ConnectionConfig
+
+logger = logging.getLogger()
+
+T = TypeVar("T")
+
+class BackgroundLoop:
+    """An asyncio event loop running forever on a daemon thread"""
+
+    def __init__(self, name: str = "companion-loop"):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, coro: Coroutine[Any, Any, T]) -> Future:
+        """Schedule a coroutine from any thread and return a concurrent future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+        """Run a coroutine on the loop and block the calling thread until it finishes"""
+        return self.submit(coro).result(timeout)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+class WeaviateConnectionManager:
+    """
+    Keeps one async Weaviate client alive on a background event loop so callers
+    don't pay for a new loop plus HTTP/gRPC handshakes on every request.
+
+    The client is connected lazily, checked with `is_ready` at most every
+    `health_check_interval` seconds and reconnected when the check or an
+    operation fails with a connection error.
+    """
+
+    def __init__(
+            self,
+            url: Optional[str] = os.getenv("WEAVIATE_URL"),
+            grpc_port: int = int(os.getenv("WEAVIATE_GRPC_PORT", 50051)),
+            pool_connections: int = 20,
+            pool_maxsize: int = 100,
+            max_retries: int = 3,
+            health_check_interval: float = 30.0,
+            query_timeout: float = 60.0,
+            insert_timeout: float = 120.0):
+        parsed = urlparse(url or "http://localhost:8080")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 8080
+        self.grpc_port = grpc_port
+        self.additional_config = AdditionalConfig(
+            connection=ConnectionConfig(
+                session_pool_connections=pool_connections,
+                session_pool_maxsize=pool_maxsize,
+                session_pool_max_retries=max_retries
+            ),
+            timeout=Timeout(query=query_timeout, insert=insert_timeout)
+        )
+        self.health_check_interval = health_check_interval
+
+        self.loop = BackgroundLoop("weaviate-loop")
+        self.client: Optional[WeaviateAsyncClient] = None
+        self.last_checked = 0.0
+        self.lock = asyncio.Lock()
+
+    async def _connect(self) -> WeaviateAsyncClient:
+        if self.client is not None:
+            try:
+                await self.client.close()
+            except Exception as e:
+                logger.info(f"Error closing stale Weaviate client: {e}")
+
+        self.client = weaviate.use_async_with_local(
+            host=self.host,
+            port=self.port,
+            grpc_port=self.grpc_port,
+            additional_config=self.additional_config
+        )
+        await self.client.connect()
+        self.last_checked = time.monotonic()
+        logger.info(f"Connected to Weaviate at {self.host}:{self.port}")
+        return self.client
+
+    async def get_client(self, force_reconnect: bool = False) -> WeaviateAsyncClient:
+        """Return the shared client, (re)connecting if it is missing or unhealthy"""
+        async with self.lock:
+            if self.client is None or force_reconnect:
+                return await self._connect()
+
+            if time.monotonic() - self.last_checked > self.health_check_interval:
+                try:
+                    healthy = self.client.is_connected() and await self.client.is_ready()
+                except Exception:
+                    healthy = False
+
+                if not healthy:
+                    logger.info("Weaviate health check failed, reconnecting.")
+                    return await self._connect()
+                self.last_checked = time.monotonic()
+
+            return self.client
+
+    async def _call(self, operation: Callable[[WeaviateAsyncClient], Awaitable[T]]) -> T:
+        client = await self.get_client()
+        try:
+            return await operation(client)
+        except (weaviate.exceptions.WeaviateConnectionError, weaviate.exceptions.WeaviateClosedClientError) as e:
+            logger.info(f"Weaviate connection lost ({e}), retrying once.")
+            client = await self.get_client(force_reconnect=True)
+            return await operation(client)
+
+    def run(self, operation: Callable[[WeaviateAsyncClient], Awaitable[T]], timeout: Optional[float] = None) -> T:
+        """Run `operation(client)` on the background loop from synchronous code"""
+        return self.loop.run(self._call(operation), timeout)
+
+    def close(self):
+        if self.client is not None:
+            self.loop.run(self.client.close())
+            self.client = None
+        self.loop.close()
@@ -0,0 +1,120 @@
+import math
+import logging
+import threading
+
+from jinja2 import Template
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from utils.metrics import tracer
+
+logger = logging.getLogger()
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap, tokenizer-free token estimate: about four UTF-8 bytes per token, which
+    is roughly two Cyrillic or four Latin characters.
+    """
+    return math.ceil(len(text.encode("utf-8")) / 4)
+
+
+class ContextBuilder:
+    """
+    Assembles the system prompt and chat history of a request within a token budget.
+
+    Compiled prompt templates are cached per model and recompiled when their source
+    changes or `invalidate` is called. When a request is over budget the oldest chat
+    turns are dropped first, then the retrieved documents with the largest distance,
+    and as a last resort the latest message is truncated.
+    """
+
+    def __init__(self, count_tokens: Optional[Callable[[str], int]] = None, message_overhead: int = 4):
+        self.count_tokens = count_tokens or estimate_tokens
+        self.message_overhead = message_overhead
+        self.templates: Dict[str, Tuple[str, Template]] = {}
+        self.lock = threading.Lock()
+        self.saved_tokens = 0
+
+    def template(self, model_id: str, source: str) -> Template:
+        with self.lock:
+            cached = self.templates.get(model_id)
+            if cached is None or cached[0] != source:
+                cached = (source, Template(source))
+                self.templates[model_id] = cached
+            return cached[1]
+
+    def invalidate(self, model_id: Optional[str] = None):
+        """Forget the compiled template of one model, or of all models"""
+        with self.lock:
+            if model_id is None:
+                self.templates.clear()
+            else:
+                self.templates.pop(model_id, None)
+
+    def _message_tokens(self, message: Dict[str, Any]) -> int:
+        return self.count_tokens(message["content"]) + self.message_overhead
+
+    def build(
+            self,
+            model_id: str,
+            source: str,
+            messages: List[Dict[str, Any]],
+            documents: List[Dict[str, Any]],
+            budget: int) -> Tuple[str, List[Dict[str, Any]], Dict[str, int]]:
+        """
+        Render the system prompt and trim the history so both fit into `budget` tokens.
+
+        Returns:
+            tuple: (system prompt, trimmed messages, report with token counts)
+        """
+        template = self.template(model_id, source)
+        # Closest documents first, so trimming from the end drops the least relevant
+        documents = sorted(documents, key=lambda doc: doc.get("distance") or 0.0)
+        messages = list(messages)
+
+        with tracer.span("prompt.render", model=model_id, documents=len(documents)):
+            system_prompt = template.render(documents=documents)
+        system_tokens = self.count_tokens(system_prompt)
+        message_tokens = [self._message_tokens(message) for message in messages]
+        tokens_before = system_tokens + sum(message_tokens)
+        dropped_messages = 0
+        dropped_documents = 0
+
+        while messages and system_tokens + sum(message_tokens) > budget:
+            if len(messages) > 1:
+                messages.pop(0)
+                message_tokens.pop(0)
+                dropped_messages += 1
+            elif documents:
+                documents.pop()
+                dropped_documents += 1
+                system_prompt = template.render(documents=documents)
+                system_tokens = self.count_tokens(system_prompt)
+            else:
+                # Only the latest message is left: keep its head
+                allowed = max(0, budget - system_tokens - self.message_overhead)
+                content = messages[0]["content"]
+                ratio = allowed / max(self.count_tokens(content), 1)
+                messages[0] = {**messages[0], "content": content[:int(len(content) * ratio)]}
+                message_tokens[0] = self._message_tokens(messages[0])
+                break
+
+        # Providers expect the conversation to open with a user turn
+        while len(messages) > 1 and messages[0]["role"] != "user":
+            messages.pop(0)
+            message_tokens.pop(0)
+            dropped_messages += 1
+
+        tokens_after = system_tokens + sum(message_tokens)
+        report = {
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "saved_tokens": tokens_before - tokens_after,
+            "dropped_messages": dropped_messages,
+            "dropped_documents": dropped_documents
+        }
+        self.saved_tokens += report["saved_tokens"]
+        if report["saved_tokens"]:
+            logger.info(
+                f"Context for {model_id}: {tokens_before} -> {tokens_after} tokens "
+                f"({dropped_messages} messages, {dropped_documents} documents dropped)"
+            )
+        return system_prompt, messages, report
@@ -1,131 +1,586 @@
 import weaviate
 
 import os
+import re
+import json
+import math
+import time
 import asyncio
 import logging
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterable, Callable, Awaitable, TypeVar, Set, Tuple
 from weaviate import WeaviateAsyncClient
-from sentence_transformers import SentenceTransformer
+from utils.cache import EmbeddingCache, RetrievalCache
+from utils.encoders import SentenceTransformerEncoder
+from utils.fms import DEFAULT_APP_ID, batched, chunk_id, group_by_app_id
+from utils.batching import MicroBatcher
+from utils.connection import WeaviateConnectionManager
+from utils.metrics import tracer
 
 from weaviate.classes.data import DataObject
-from weaviate.classes.query import MetadataQuery
+from weaviate.classes.query import MetadataQuery, Filter
 from weaviate.classes.config import Configure, Property, DataType
+from weaviate.classes.tenants import Tenant, TenantActivityStatus
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger()
 
+T = TypeVar("T")
+
+TENANT_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def tenant_name(app_id: str) -> str:
+    """Weaviate tenant of an application, which is its app_id"""
+    if not TENANT_NAME.match(app_id or ""):
+        raise ValueError(f"app_id '{app_id}' is not a valid tenant name (1-64 letters, digits, '-' or '_')")
+    return app_id
+
+
+QUANTIZERS = ("none", "pq", "bq", "sq", "rq")
+
+# HNSW and compression settings of new collections, the values shown are Weaviate's defaults
+DEFAULT_INDEX_SETTINGS: Dict[str, Any] = {
+    "ef": int(os.getenv("HNSW_EF", -1)),
+    "ef_construction": int(os.getenv("HNSW_EF_CONSTRUCTION", 128)),
+    "max_connections": int(os.getenv("HNSW_MAX_CONNECTIONS", 32)),
+    "quantization": os.getenv("VECTOR_QUANTIZATION", "none"),
+    "rescore_limit": int(os.getenv("QUANTIZATION_RESCORE_LIMIT", 200)),
+    "pq_segments": None,
+    "training_limit": None
+}
+
+def vector_index_config(settings: Dict[str, Any], dimension: int):
+    """
+    HNSW index configuration for `settings` (see DEFAULT_INDEX_SETTINGS). `ef` trades query
+    speed for recall, `ef_construction` and `max_connections` build time and memory for
+    graph quality. Quantized vectors are searched in memory and the closest
+    `rescore_limit` candidates are rescored with the full vectors kept on disk.
+    """
+    quantization = settings.get("quantization") or "none"
+    if quantization not in QUANTIZERS:
+        raise ValueError(f"Unknown quantization '{quantization}', expected one of {QUANTIZERS}")
+
+    quantizer = None
+    # Only PQ and SQ are trained; RQ and BQ have no training step
+    training = {"training_limit": settings["training_limit"]} if settings.get("training_limit") else {}
+    if quantization == "pq":
+        quantizer = Configure.VectorIndex.Quantizer.pq(segments=pq_segments(settings, dimension), **training)
+    elif quantization == "bq":
+        quantizer = Configure.VectorIndex.Quantizer.bq(rescore_limit=settings.get("rescore_limit"))
+    elif quantization == "sq":
+        quantizer = Configure.VectorIndex.Quantizer.sq(rescore_limit=settings.get("rescore_limit"), **training)
+    elif quantization == "rq":
+        quantizer = Configure.VectorIndex.Quantizer.rq(rescore_limit=settings.get("rescore_limit"))
+
+    return Configure.VectorIndex.hnsw(
+        ef=settings.get("ef"),
+        ef_construction=settings.get("ef_construction"),
+        max_connections=settings.get("max_connections"),
+        quantizer=quantizer
+    )
+
+def pq_segments(settings: Dict[str, Any], dimension: int) -> int:
+    """PQ segments (one byte each per vector), a quarter of the dimensions unless configured"""
+    return settings.get("pq_segments") or max(1, dimension // 4)
+
+def estimate_index_memory(rows: int, dimension: int, settings: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Approximate memory of an HNSW index: the (compressed) vectors plus the layer-0 graph
+    with up to 2 x max_connections 8-byte links per node. Quantized indexes keep the
+    full-precision vectors on disk for rescoring.
+    """
+    quantization = settings.get("quantization") or "none"
+    vector_bytes = {
+        "none": 4 * dimension,
+        "pq": pq_segments(settings, dimension),
+        "bq": math.ceil(dimension / 8),
+        "sq": dimension,
+        "rq": dimension
+    }[quantization]
+    graph_bytes = rows * 2 * (settings.get("max_connections") or 32) * 8
+    return {
+        "vector_bytes": rows * vector_bytes,
+        "graph_bytes": graph_bytes,
+        "memory_bytes": rows * vector_bytes + graph_bytes,
+        "disk_vector_bytes": rows * 4 * dimension if quantization != "none" else 0,
+        "compression": 4 * dimension / vector_bytes
+    }
+
+
 class WeaviateDatabaseManager:
 
-    def __init__(self, model_name: str = "jinaai/jina-embeddings-v3"):
-        self.model = SentenceTransformer(
-            model_name, 
-            trust_remote_code=True,
-            device="cuda:0"
-        )
-        self.collection_name = "Documents"
+    def __init__(
+            self, 
+            model_name: str = "jinaai/jina-embeddings-v3",
+            cache_path: Optional[str] = os.getenv("EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite3"),
+            cache_size: int = 50000,
+            connection: Optional[WeaviateConnectionManager] = None,
+            encoder: Optional[SentenceTransformerEncoder] = None,
+            query_batch_size: int = 32,
+            query_batch_wait_ms: float = 5.0,
+            retrieval_cache_size: int = 1024,
+            retrieval_cache_epsilon: float = float(os.getenv("RETRIEVAL_CACHE_EPSILON", 0.0)),
+            tenant_idle_seconds: float = float(os.getenv("TENANT_IDLE_SECONDS", 0)),
+            collection_name: str = "Documents",
+            index_settings: Optional[Dict[str, Any]] = None):
+        self.encoder = encoder or SentenceTransformerEncoder(model_name)
+        self.collection_name = collection_name
+        self.index_settings = {**DEFAULT_INDEX_SETTINGS, **(index_settings or {})}
+        self.cache = EmbeddingCache(self.encoder.signature, cache_path, cache_size)
+        self.verified_collection = False
+        self.connection = connection or WeaviateConnectionManager()
+        # Query embeddings from concurrent sessions share one forward pass
+        self.query_batcher = MicroBatcher(self.embed_texts, query_batch_size, query_batch_wait_ms)
+        self.retrieval_cache = RetrievalCache(retrieval_cache_size, retrieval_cache_epsilon)
+
+        # One tenant per app_id; None until the collection has been inspected
+        self.multi_tenant: Optional[bool] = None
+        self.tenant_idle_seconds = tenant_idle_seconds
+        self.tenant_activity: Dict[str, float] = {}
+        self.known_tenants: Set[str] = set()
+        self.started = self.last_offload = time.monotonic()
+        self.offload_task: Optional[asyncio.Task] = None
 
-    def embed_texts(self, texts: List[str]) -> List[List[float]]:
-        """Generate embedding for a batch of sentences or documents"""
-        embeddings = self.model.encode(texts, normalize_embeddings=True)
-        return embeddings.tolist()
+    def run(self, operation: Callable[[WeaviateAsyncClient], Awaitable[T]], timeout: Optional[float] = None) -> T:
+        """Run `operation(client)` with the shared, long-lived async client"""
+        return self.connection.run(operation, timeout)
+
+    def embed_texts(self, texts: List[str], task: Optional[str] = None) -> List[List[float]]:
+        """Generate embedding for a batch of sentences or documents, only encoding cache misses"""
+        keys = [self.cache.key(text, task) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        # Duplicates inside one batch are encoded once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            with tracer.span("embed_texts", log=False, items=len(texts), misses=len(missing)):
+                embeddings = self.encoder.encode(list(missing.values()), task)
+            fresh = list(zip(missing.keys(), embeddings))
+            self.cache.put_many(fresh)
+            cached.update(fresh)
+
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses.")
+        return [cached[key].tolist() for key in keys]
     
-    async def create_collect(self, async_client: WeaviateAsyncClient):
-        """Create a collection with vector configuration"""
+    async def create_collect(
+            self,
+            async_client: WeaviateAsyncClient,
+            recreate: bool = False,
+            index_settings: Optional[Dict[str, Any]] = None):
+        """
+        Create a multi-tenant collection with vector configuration, keeping an existing one
+        unless `recreate` is set. Each app_id gets its own tenant, created on first insert.
+        `index_settings` override the manager's HNSW / quantization settings for this collection;
+        they only take effect when it is created.
+        """
+        settings = {**self.index_settings, **(index_settings or {})}
         try:
             if await async_client.collections.exists(self.collection_name):
+                if not recreate:
+                    if settings != DEFAULT_INDEX_SETTINGS:
+                        logger.info(
+                            f"Collection '{self.collection_name}' already exists, index settings {settings} "
+                            f"were not applied. Recreate it to change its HNSW / quantization settings."
+                        )
+                    await self.verify_collection(async_client)
+                    return async_client.collections.get(self.collection_name)
                 await async_client.collections.delete(self.collection_name)
+                self.known_tenants.clear()
             
             collection = await async_client.collections.create(
                 name=self.collection_name,
+                description=json.dumps(self.vector_space),
                 properties=[
                     Property(name="content", data_type=DataType.TEXT),
                     Property(name="app_id", data_type=DataType.TEXT),
                     Property(name="document_path", data_type=DataType.TEXT),
+                    Property(name="metadata", data_type=DataType.OBJECT, nested_properties=[
+                        Property(name="start", data_type=DataType.INT),
+                        Property(name="end", data_type=DataType.INT),
+                        Property(name="size", data_type=DataType.INT),
+                    ]),
                 ],
-                vector_config=Configure.Vectors.self_provided()
+                vector_config=Configure.Vectors.self_provided(
+                    vector_index_config=vector_index_config(settings, self.encoder.dimension)
+                ),
+                multi_tenancy_config=Configure.multi_tenancy(
+                    enabled=True,
+                    auto_tenant_creation=True,
+                    auto_tenant_activation=True
+                )
             )
-            logger.info(f"Collection '{self.collection_name}' created successfully")
+            logger.info(f"Collection '{self.collection_name}' created successfully with index settings {settings}")
+            self.verified_collection = True
+            self.multi_tenant = True
+            self.retrieval_cache.bump()
             return collection
             
         except Exception as e:
             logger.info(f"Error creating collections: {e}")
             raise weaviate.exceptions.WeaviateBaseError("Error spawning collections.")
+
+    @property
+    def vector_space(self) -> Dict[str, Any]:
+        """Encoder settings recorded on the collection so stored and query vectors always match"""
+        return {
+            "encoder": self.encoder.model_name,
+            "backend": self.encoder.backend,
+            "dimension": self.encoder.dimension
+        }
+
+    async def verify_collection(self, async_client: WeaviateAsyncClient):
+        """Refuse to mix vectors from a different encoder backend or dimension into the collection"""
+        if self.verified_collection:
+            return
+
+        config = await async_client.collections.get(self.collection_name).config.get()
+        try:
+            recorded = json.loads(config.description or "{}")
+        except json.JSONDecodeError:
+            recorded = {}
+
+        # Collections created before the encoder was recorded hold full-precision vectors
+        recorded = {"encoder": self.encoder.model_name, "backend": "torch", "dimension": 1024, **recorded}
+        if recorded != self.vector_space:
+            raise ValueError(
+                f"Collection '{self.collection_name}' was built with {recorded}, "
+                f"but the configured encoder is {self.vector_space}. Recreate the collection or change the encoder."
+            )
+
+        self.multi_tenant = config.multi_tenancy_config.enabled
+        if not self.multi_tenant:
+            logger.info(
+                f"Collection '{self.collection_name}' predates multi-tenancy, searches are filtered by app_id "
+                f"but still scan every application. Recreate it and re-ingest to partition by app_id."
+            )
+        self.verified_collection = True
+
+    def tenant_collection(self, async_client: WeaviateAsyncClient, app_id: str):
+        """The collection scoped to the tenant of `app_id` (the whole collection for legacy ones)"""
+        collection = async_client.collections.get(self.collection_name)
+        self.tenant_activity[app_id] = time.monotonic()
+        return collection.with_tenant(tenant_name(app_id)) if self.multi_tenant else collection
+
+    async def existing_tenant(self, async_client: WeaviateAsyncClient, app_id: str):
+        """Like `tenant_collection`, but None while nothing has been inserted for `app_id` yet"""
+        collection = self.tenant_collection(async_client, app_id)
+        if not self.multi_tenant or app_id in self.known_tenants:
+            return collection
+        # Auto tenant creation only covers inserts, reading a missing tenant is an error
+        if not await async_client.collections.get(self.collection_name).tenants.exists(tenant_name(app_id)):
+            return None
+        self.known_tenants.add(app_id)
+        return collection
+
+    def _tenant_filter(self, app_id: str):
+        # Only needed when the collection is not partitioned by tenant
+        return None if self.multi_tenant else Filter.by_property("app_id").equal(app_id)
+
+    def _schedule_offload(self, async_client: WeaviateAsyncClient):
+        """Start a background sweep of idle tenants at most once per `tenant_idle_seconds`"""
+        if self.tenant_idle_seconds <= 0 or not self.multi_tenant:
+            return
+        if time.monotonic() - self.last_offload < self.tenant_idle_seconds:
+            return
+        self.last_offload = time.monotonic()
+        self.offload_task = asyncio.create_task(self.offload_idle_tenants(async_client))
+
+    async def offload_idle_tenants(
+            self,
+            async_client: WeaviateAsyncClient,
+            idle_seconds: Optional[float] = None,
+            status: TenantActivityStatus = TenantActivityStatus.INACTIVE) -> List[str]:
+        """
+        Deactivate tenants this process has not used for `idle_seconds`, which frees their
+        memory on the Weaviate nodes. `status` may be OFFLOADED when an offload module (S3)
+        is configured. Auto-activation brings a tenant back on its next query or insert.
+
+        Idleness is tracked per process: only tenants this manager has used are considered,
+        since it cannot tell whether other processes still query the rest.
+        """
+        idle_seconds = idle_seconds if idle_seconds is not None else self.tenant_idle_seconds
+        try:
+            collection = async_client.collections.get(self.collection_name)
+            tenants = await collection.tenants.get()
+            now = time.monotonic()
+            idle = [
+                name for name, tenant in tenants.items()
+                if tenant.activity_status == TenantActivityStatus.ACTIVE
+                and name in self.tenant_activity
+                and now - self.tenant_activity[name] > idle_seconds
+            ]
+            if idle:
+                await collection.tenants.update([Tenant(name=name, activity_status=status) for name in idle])
+                logger.info(f"Set {len(idle)} idle tenants to {status.value}: {', '.join(idle)}")
+            return idle
+        except Exception as e:
+            logger.info(f"Offloading idle tenants failed: {e}")
+            return []
         
     
     async def batch_insert(self, async_client: WeaviateAsyncClient, documents: List[Dict[str, Any]]):
-        """Insert documents with vectors in batches"""
+        """Insert documents with vectors in batches, each into the tenant of its app_id"""
+        responses = {}
         try:
-            collection = async_client.collections.get(self.collection_name)
-            texts_to_embed = [document["content"] for document in documents]
-            logger.info(f"Generating embeddings for {len(texts_to_embed)} documents.")
-            vectors = self.embed_texts(texts_to_embed)
-
-            data_objects = []
-            for i, doc in enumerate(documents):
-                data_objects.append(
-                    DataObject(
-                        properties={
-                            "content": doc["content"],
-                            "app_id": doc["app_id"],
-                            "document_path": doc["document_path"]
-                        },
-                        vector=vectors[i]
-                    )
-                )
-            
-            logger.info(f"About to insert {len(data_objects)} elements.")
-            response = await collection.data.insert_many(data_objects)
+            await self.verify_collection(async_client)
+            for app_id, tenant_documents in group_by_app_id(documents).items():
+                collection = self.tenant_collection(async_client, app_id)
+                existing = await self.existing_ids(async_client, [chunk_id(doc) for doc in tenant_documents], app_id)
+                tenant_documents = [doc for doc in tenant_documents if chunk_id(doc) not in existing]
+                if not tenant_documents:
+                    logger.info(f"All {len(existing)} documents of '{app_id}' are already stored, nothing to insert.")
+                    continue
 
-            if response.has_errors:
-                logger.info(f"Some objects fail to be inserted.")
-                for error in response.errors:
-                    logger.info(f"- Insertion Error: {error}")
-            
-            else:
-                logger.info(f"{len(data_objects)} objects successfully inserted into {self.collection_name}!")
+                texts_to_embed = [document["content"] for document in tenant_documents]
+                logger.info(f"Generating embeddings for {len(texts_to_embed)} documents ({len(existing)} unchanged skipped).")
+                # Encoding is CPU-bound, keep it off the shared event loop
+                vectors = await asyncio.to_thread(self.embed_texts, texts_to_embed)
+                data_objects = self._to_data_objects(tenant_documents, vectors)
+
+                logger.info(f"About to insert {len(data_objects)} elements for '{app_id}'.")
+                response = await collection.data.insert_many(data_objects)
+                self.retrieval_cache.bump()
+                responses[app_id] = response
+
+                if response.has_errors:
+                    logger.info(f"Some objects fail to be inserted.")
+                    for error in response.errors:
+                        logger.info(f"- Insertion Error: {error}")
+
+                else:
+                    logger.info(f"{len(data_objects)} objects successfully inserted into {self.collection_name}/{app_id}!")
 
         except Exception as e:
             logger.info(f"Batch insert process hasn't been successful.")
             raise weaviate.exceptions.WeaviateInsertManyAllFailedError("Batch insert has failed.")
 
-        return response
+        return responses
+
+    def _to_data_objects(self, documents: List[Dict[str, Any]], vectors: List[List[float]]) -> List[DataObject]:
+        data_objects = []
+        for doc, vector in zip(documents, vectors):
+            properties = {
+                "content": doc["content"],
+                "app_id": doc["app_id"],
+                "document_path": doc["document_path"]
+            }
+            if doc.get("metadata"):
+                properties["metadata"] = doc["metadata"]
+            data_objects.append(DataObject(properties=properties, uuid=chunk_id(doc), vector=vector))
+        return data_objects
+
+    async def existing_ids(self, async_client: WeaviateAsyncClient, ids: List[str], app_id: str = DEFAULT_APP_ID) -> Set[str]:
+        """Subset of `ids` already stored in the tenant of `app_id`"""
+        if not ids:
+            return set()
+        collection = await self.existing_tenant(async_client, app_id)
+        if collection is None:
+            return set()
+        filters = Filter.by_id().contains_any(ids)
+        if not self.multi_tenant:
+            # Chunk IDs do not include the app_id, the same chunk may be stored for another application
+            filters = filters & self._tenant_filter(app_id)
+        response = await collection.query.fetch_objects(
+            filters=filters,
+            limit=len(ids),
+            return_properties=[]
+        )
+        return {str(obj.uuid) for obj in response.objects}
+
+    async def delete_document(
+            self,
+            async_client: WeaviateAsyncClient,
+            document_path: str,
+            keep_ids: Optional[Set[str]] = None,
+            app_id: str = DEFAULT_APP_ID) -> int:
+        """Delete every chunk of `document_path` in the tenant of `app_id`, except the ones listed in `keep_ids`"""
+        collection = await self.existing_tenant(async_client, app_id)
+        if collection is None:
+            return 0
+        filters = Filter.by_property("document_path").equal(document_path)
+        if not self.multi_tenant:
+            filters = filters & self._tenant_filter(app_id)
+
+        # The pinned client and server have no ContainsNone, so the kept IDs are subtracted here
+        stored = []
+        page_size = 1000
+        while True:
+            response = await collection.query.fetch_objects(
+                filters=filters,
+                limit=page_size,
+                offset=len(stored),
+                return_properties=[]
+            )
+            stored.extend(str(obj.uuid) for obj in response.objects)
+            if len(response.objects) < page_size:
+                break
+        stale = [uuid for uuid in stored if uuid not in (keep_ids or set())]
+
+        deleted = 0
+        for window in batched(stale, 500):
+            response = await collection.data.delete_many(where=Filter.by_id().contains_any(window))
+            deleted += response.successful
+        if deleted:
+            self.retrieval_cache.bump()
+        logger.info(f"Deleted {deleted} stale chunks of '{document_path}'.")
+        return deleted
+
+    async def stream_insert(
+            self, 
+            async_client: WeaviateAsyncClient, 
+            documents: Iterable[Dict[str, Any]],
+            batch_size: int = 64,
+            max_concurrency: int = 4,
+            replace: bool = True) -> Dict[str, Any]:
+        """
+        Embed and upsert a stream of documents in fixed-size batches.
+
+        At most `max_concurrency` `insert_many` calls are in flight; once that many are
+        pending the producer stops pulling chunks, so memory stays bounded by the batch
+        size rather than the size of the whole document.
+
+        Chunk IDs are deterministic, so chunks that are already stored are skipped without
+        being embedded. With `replace`, chunks of the ingested documents that no longer
+        appear in the stream are deleted afterwards. Every chunk goes to the tenant of its app_id.
+        """
+        await self.verify_collection(async_client)
+        slots = asyncio.Semaphore(max_concurrency)
+        pending = set()
+        seen_ids: Dict[Tuple[str, str], Set[str]] = {}
+        summary = {"inserted": 0, "skipped": 0, "deleted": 0, "failed": 0, "batches": 0, "elapsed_seconds": 0.0}
+        start_time = time.perf_counter()
+
+        async def insert(collection, data_objects: List[DataObject]):
+            try:
+                with tracer.span("ingest.insert_many", log=False, objects=len(data_objects)):
+                    response = await collection.data.insert_many(data_objects)
+                self.retrieval_cache.bump()
+                summary["failed"] += len(response.errors)
+                summary["inserted"] += len(data_objects) - len(response.errors)
+                for error in response.errors.values():
+                    logger.info(f"- Insertion Error: {error}")
+            except Exception as e:
+                logger.info(f"Batch of {len(data_objects)} objects failed to be inserted: {e}")
+                summary["failed"] += len(data_objects)
+            finally:
+                slots.release()
+
+        # Pulling the next batch runs extraction and chunking, keep it off the event loop
+        batches = batched(documents, batch_size)
+        while (batch := await asyncio.to_thread(next, batches, None)) is not None:
+            for app_id, tenant_batch in group_by_app_id(batch).items():
+                ids = [chunk_id(doc) for doc in tenant_batch]
+                for doc, uuid in zip(tenant_batch, ids):
+                    seen_ids.setdefault((app_id, doc["document_path"]), set()).add(uuid)
+
+                existing = await self.existing_ids(async_client, ids, app_id)
+                tenant_batch = [doc for doc, uuid in zip(tenant_batch, ids) if uuid not in existing]
+                summary["skipped"] += len(existing)
+                if not tenant_batch:
+                    continue
+
+                await slots.acquire()
+                with tracer.span("ingest.embed", log=False, chunks=len(tenant_batch)):
+                    vectors = await asyncio.to_thread(self.embed_texts, [doc["content"] for doc in tenant_batch])
+                collection = self.tenant_collection(async_client, app_id)
+                task = asyncio.create_task(insert(collection, self._to_data_objects(tenant_batch, vectors)))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                summary["batches"] += 1
+
+        if pending:
+            await asyncio.gather(*pending)
+
+        # Keep the previous version around if any part of the new one failed to land
+        if replace and not summary["failed"]:
+            for (app_id, document_path), ids in seen_ids.items():
+                summary["deleted"] += await self.delete_document(async_client, document_path, ids, app_id)
+
+        summary["elapsed_seconds"] = time.perf_counter() - start_time
+        logger.info(
+            f"Streamed {summary['inserted']} objects into {self.collection_name} "
+            f"in {summary['batches']} batches ({summary['skipped']} unchanged, "
+            f"{summary['deleted']} stale deleted, {summary['failed']} failed)."
+        )
+        return summary
     
     async def search_database(
             self, 
             async_client: WeaviateAsyncClient, 
             query_text: str, 
             limit: int = 5,
-            distance_threshold: float = 0.25):
+            distance_threshold: float = 0.25,
+            app_id: str = DEFAULT_APP_ID):
+        """Search the documents of one application, only its tenant's vectors are scanned"""
         try:
-            collection = async_client.collections.get(self.collection_name)
+            results = self.retrieval_cache.get(query_text, limit, distance_threshold, app_id)
+            if results is not None:
+                logger.info(f"Retrieval cache hit, {self.retrieval_cache.stats['saved_seconds']:.2f}s saved so far")
+                return results
 
-            query_vector = self.embed_texts([query_text])[0]
+            await self.verify_collection(async_client)
+            version = self.retrieval_cache.version
 
-            response = await collection.query.near_vector(
-                near_vector=query_vector,
-                limit=limit,
-                distance=distance_threshold,
-                return_metadata=MetadataQuery(distance=True)
-            )
-            
-            results = []
-            for obj in response.objects:
-                results.append({
-                    "uuid": str(obj.uuid),
-                    "content": obj.properties.get("content"),
-                    "app_id": obj.properties.get("app_id"),
-                    "document_path": obj.properties.get("document_path"),
-                    "metadata": obj.properties.get("metadata"),
-                    "distance": obj.metadata.distance
-                })
+            embed_start = time.perf_counter()
+            with tracer.span("search.query_embedding"):
+                query_vector = await asyncio.wrap_future(self.query_batcher.submit(query_text))
+            embed_seconds = time.perf_counter() - embed_start
+
+            results = self.retrieval_cache.get_similar(query_vector, limit, distance_threshold, app_id)
+            if results is not None:
+                logger.info(f"Approximate retrieval cache hit, {self.retrieval_cache.stats['saved_seconds']:.2f}s saved so far")
+                return results
+
+            search_start = time.perf_counter()
+            with tracer.span("search.near_vector", limit=limit, app_id=app_id) as span:
+                results = await self._near_vector(async_client, query_vector, limit, distance_threshold, app_id)
+                span["results"] = len(results)
+            search_seconds = time.perf_counter() - search_start
 
+            self.retrieval_cache.put(
+                query_text, limit, distance_threshold, query_vector, results, embed_seconds, search_seconds, version, app_id
+            )
+            self._schedule_offload(async_client)
             logger.info(f"Found {len(results)} similar documents")
             return results
         
         except Exception as e:
             logger.info(f"There appeared an error: {str(e)}")
-            return
+            return []
+
+    async def _near_vector(
+            self,
+            async_client: WeaviateAsyncClient,
+            query_vector: List[float],
+            limit: int,
+            distance_threshold: float,
+            app_id: str = DEFAULT_APP_ID) -> List[Dict[str, Any]]:
+        collection = await self.existing_tenant(async_client, app_id)
+        if collection is None:
+            return []
+        response = await collection.query.near_vector(
+            near_vector=query_vector,
+            limit=limit,
+            distance=distance_threshold,
+            filters=self._tenant_filter(app_id),
+            return_metadata=MetadataQuery(distance=True)
+        )
+        
+        results = []
+        for obj in response.objects:
+            results.append({
+                "uuid": str(obj.uuid),
+                "content": obj.properties.get("content"),
+                "app_id": obj.properties.get("app_id"),
+                "document_path": obj.properties.get("document_path"),
+                "metadata": obj.properties.get("metadata"),
+                "distance": obj.metadata.distance
+            })
+        return results
     
 async def main():
 
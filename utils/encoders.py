@@ -0,0 +1,194 @@
+import os
+import time
+import torch
+import threading
+import logging
+import numpy as np
+
+from typing import List, Dict, Any, Optional
+from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger()
+
+def detect_devices() -> List[str]:
+    """List the accelerators available on this host, falling back to the CPU"""
+    if torch.cuda.is_available():
+        return [f"cuda:{i}" for i in range(torch.cuda.device_count())]
+    if torch.backends.mps.is_available():
+        return ["mps"]
+    return ["cpu"]
+
+
+def plan_token_batches(lengths: List[int], max_tokens: int, max_batch_size: int = 256) -> List[List[int]]:
+    """
+    Group item indices into batches of similar token length.
+
+    Items are sorted longest first and a batch grows while its padded size
+    (items x longest item) stays within `max_tokens`, so short chunks are no
+    longer padded up to the longest chunk of an arbitrary arrival-order batch.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches = []
+    current: List[int] = []
+
+    for index in order:
+        # Sorted descending, so the first item of a batch is its longest
+        longest = lengths[current[0]] if current else lengths[index]
+        if current and ((len(current) + 1) * longest > max_tokens or len(current) >= max_batch_size):
+            batches.append(current)
+            current = []
+        current.append(index)
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def padded_tokens(lengths: List[int], batches: List[List[int]]) -> int:
+    """Number of token slots a model processes for the given batches, padding included"""
+    return sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+
+
+BACKENDS = ("torch", "int8", "onnx")
+
+
+class SentenceTransformerEncoder:
+    """
+    SentenceTransformer wrapper with automatic device selection and an optional
+    multi-process pool that shards large batches across devices or CPU workers.
+
+    Args:
+        model_name (str): Hugging Face model id
+        backend (str): "torch" runs the full-precision model, "int8" applies dynamic int8
+            quantization to its linear layers on the CPU and "onnx" loads `onnx_file` through
+            the sentence-transformers ONNX Runtime backend
+        output_dim (int): Truncate vectors to this many Matryoshka dimensions (re-normalized)
+        onnx_file (str): Exported model file inside the model repository, for the onnx backend
+        device (str): "auto" or an explicit torch device for the main model
+        num_workers (int): Pool size. Defaults to one worker per GPU when more than one is
+            visible, and no pool otherwise. On CPU hosts each worker is a separate process.
+        pool_min_batch (int): Smaller batches are encoded in-process, the pool isn't worth it
+        batch_size (int): Per-forward-pass batch size for the multi-process pool
+        max_tokens_per_batch (int): Padded token budget of one in-process forward pass
+    """
+
+    def __init__(
+            self,
+            model_name: str = "jinaai/jina-embeddings-v3",
+            backend: str = os.getenv("EMBEDDING_BACKEND", "torch"),
+            output_dim: Optional[int] = int(os.getenv("EMBEDDING_DIM", 0)) or None,
+            onnx_file: str = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model.onnx"),
+            device: str = os.getenv("EMBEDDING_DEVICE", "auto"),
+            num_workers: Optional[int] = int(os.getenv("EMBEDDING_WORKERS", 0)) or None,
+            pool_min_batch: int = 256,
+            batch_size: int = 32,
+            max_tokens_per_batch: int = 16384):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend '{backend}', expected one of {BACKENDS}")
+
+        # Quantized and ONNX runtimes are CPU paths
+        available = detect_devices() if backend == "torch" else ["cpu"]
+        self.model_name = model_name
+        self.backend = backend
+        self.device = available[0] if device == "auto" or backend != "torch" else device
+        self.batch_size = batch_size
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.pool_min_batch = pool_min_batch
+
+        model_kwargs = {"backend": "onnx", "model_kwargs": {"file_name": onnx_file}} if backend == "onnx" else {}
+        self.model = SentenceTransformer(
+            model_name,
+            trust_remote_code=True,
+            device=self.device,
+            truncate_dim=output_dim,
+            **model_kwargs
+        )
+        if backend == "int8":
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+        if backend != "torch":
+            # Workers would reload the full-precision model, keep these runtimes in-process
+            self.pool_devices = []
+        elif num_workers is None:
+            self.pool_devices = available if len(available) > 1 else []
+        elif num_workers > 1:
+            self.pool_devices = [available[i % len(available)] for i in range(num_workers)]
+        else:
+            self.pool_devices = []
+        self.pool = None
+        # The pool has one input and one output queue, concurrent callers would take each other's results
+        self.pool_lock = threading.Lock()
+
+        self.chunks_encoded = 0
+        self.seconds_encoding = 0.0
+        logger.info(f"Embedding model '{self.signature}' loaded on {self.device}, pool devices: {self.pool_devices or 'none'}")
+
+    @property
+    def signature(self) -> str:
+        """Identifies the vector space: vectors are only comparable when signatures match"""
+        return f"{self.model_name}|{self.backend}|{self.dimension}"
+
+    def encode(self, texts: List[str], task: Optional[str] = None) -> np.ndarray:
+        """Encode texts into L2-normalized float32 vectors, preserving input order"""
+        encode_kwargs: Dict[str, Any] = {"task": task} if task else {}
+        start_time = time.perf_counter()
+
+        lengths = self.token_lengths(texts)
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+
+        if self.pool_devices and len(texts) >= self.pool_min_batch:
+            # The pool splits its input into contiguous chunks, sorting keeps each one homogeneous
+            order = sorted(range(len(texts)), key=lambda i: lengths[i], reverse=True)
+            with self.pool_lock:
+                if self.pool is None:
+                    self.pool = self.model.start_multi_process_pool(target_devices=self.pool_devices)
+                # encode(pool=..., chunk_size=...) is available since sentence-transformers 5.0, which uv.lock pins
+                embeddings[order] = self.model.encode(
+                    [texts[i] for i in order],
+                    pool=self.pool,
+                    batch_size=self.batch_size,
+                    chunk_size=max(self.batch_size, len(texts) // (4 * len(self.pool_devices))),
+                    normalize_embeddings=True,
+                    **encode_kwargs
+                )
+        else:
+            for batch in plan_token_batches(lengths, self.max_tokens_per_batch):
+                embeddings[batch] = self.model.encode(
+                    [texts[i] for i in batch],
+                    batch_size=len(batch),
+                    normalize_embeddings=True,
+                    **encode_kwargs
+                )
+
+        elapsed = time.perf_counter() - start_time
+        self.chunks_encoded += len(texts)
+        self.seconds_encoding += elapsed
+        if len(texts) > 1:
+            logger.info(f"Encoded {len(texts)} chunks in {elapsed:.2f}s ({len(texts) / max(elapsed, 1e-9):.1f} chunks/s)")
+
+        return embeddings
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        """Token count of each text after truncation to the model's maximum sequence length"""
+        encoded = self.model.tokenizer(
+            texts,
+            add_special_tokens=True,
+            truncation=True,
+            max_length=self.model.max_seq_length
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    @property
+    def throughput(self) -> Dict[str, float]:
+        return {
+            "chunks": self.chunks_encoded,
+            "seconds": self.seconds_encoding,
+            "chunks_per_sec": self.chunks_encoded / self.seconds_encoding if self.seconds_encoding else 0.0
+        }
+
+    def close(self):
+        with self.pool_lock:
+            if self.pool is not None:
+                self.model.stop_multi_process_pool(self.pool)
+                self.pool = None
@@ -1,54 +1,251 @@
+import os
 import re
+import math
+import time
+import hashlib
 import weaviate
 
-def clean_and_chunk_text(text, filename: str, chunk_size=200, overlap=50):
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+from pdfminer.layout import LTTextContainer
+from pdfminer.high_level import extract_pages as extract_pages_layout
+from utils.metrics import tracer
+
+# Terminal punctuation (Latin/Cyrillic and Mongolian script) and closing quotes, followed by whitespace
+SENTENCE_END = re.compile(r'[.!?…᠃᠉]+["\'»”’)\]]*(?=\s|$)|\n\s*\n')
+WORD = re.compile(r'\S+')
+
+# Tenant of documents uploaded without an explicit application
+DEFAULT_APP_ID = os.getenv("DEFAULT_APP_ID", "egune-test")
+
+# (start, end, size, normalized text, raw text from start to end)
+Sentence = Tuple[int, int, int, str, str]
+
+
+def clean_and_chunk_text(
+        text,
+        filename: str,
+        chunk_size=200,
+        overlap=50,
+        count_tokens: Optional[Callable[[str], int]] = None,
+        app_id: str = DEFAULT_APP_ID):
     """
-    Clean text and split it into chunks of specified word count
-    
+    Clean text and split it into sentence-aligned chunks of about `chunk_size` words
+
     Args:
         text (str): Raw text from PDF extraction
-        chunk_size (int): Target number of words per chunk (default: 200)
-        overlap (int): Number of words to overlap between chunks (default: 50)
-    
+        chunk_size (int): Target number of words (or tokens) per chunk (default: 200)
+        overlap (int): Number of words (or tokens) to overlap between chunks (default: 50)
+        count_tokens (callable): Measure chunks in tokenizer tokens instead of words
+        app_id (str): Application (tenant) the chunks belong to
+
     Returns:
         list: List of text chunks ready for vector database
     """
-    
-    # Clean the text - remove multiple newlines and extra whitespace
-    cleaned_text = re.sub(r'\n+', ' ', text)  # Replace newlines with spaces
-    cleaned_text = re.sub(r'\s+', ' ', cleaned_text)  # Replace multiple spaces with single space
-    cleaned_text = cleaned_text.strip()  # Remove leading/trailing whitespace
-
-    # Split into words
-    words = cleaned_text.split()
-    
-    if len(words) == 0:
-        return []
-    
-    chunks = []
-    start_idx = 0
-    
-    while start_idx < len(words):
-        # Get chunk_size words starting from start_idx
-        end_idx = min(start_idx + chunk_size, len(words))
-        chunk_words = words[start_idx:end_idx]
-        chunk_text = ' '.join(chunk_words)
-        
-        chunks.append({
-            "content": chunk_text,
-            "app_id": "egune-test",
-            "document_path": filename
-        })
-        
-        # If this is the last chunk, break
-        if end_idx >= len(words):
-            break
-            
-        # Move start_idx forward, accounting for overlap
-        start_idx = end_idx - overlap
-        
-        # Ensure we don't go backwards
-        if start_idx <= 0:
-            start_idx = end_idx
-
-    return chunks
\ No newline at end of file
+    return list(stream_chunks([text], filename, chunk_size, overlap, count_tokens, app_id))
+
+
+def extract_pages(pdf_file) -> Iterator[str]:
+    """
+    Lazily extract text from a PDF one page at a time
+
+    Args:
+        pdf_file: Path or binary file-like object of the PDF
+
+    Yields:
+        str: Raw text of each page
+    """
+    pages = extract_pages_layout(pdf_file)
+    while True:
+        # Layout analysis happens lazily inside next(), so that is what gets timed
+        with tracer.span("ingest.extract_page", log=False):
+            page_layout = next(pages, None)
+            if page_layout is None:
+                return
+            text = "".join(
+                element.get_text() for element in page_layout if isinstance(element, LTTextContainer)
+            )
+        yield text
+
+
+def _measure(raw: str, raw_start: int, max_size: int, count_tokens: Optional[Callable[[str], int]]) -> Iterator[Sentence]:
+    words = raw.split()
+    if not words:
+        return
+    text = ' '.join(words)
+    size = count_tokens(text) if count_tokens else len(words)
+    if size <= max_size:
+        yield raw_start + len(raw) - len(raw.lstrip()), raw_start + len(raw.rstrip()), size, text, raw.strip()
+        return
+
+    # A sentence longer than a whole chunk is cut at word boundaries into near-equal pieces
+    per_piece = math.ceil(len(words) / math.ceil(size / max_size))
+    spans = [match.span() for match in WORD.finditer(raw)]
+    for i in range(0, len(words), per_piece):
+        piece = ' '.join(words[i:i + per_piece])
+        last = min(i + per_piece, len(words)) - 1
+        size = count_tokens(piece) if count_tokens else last - i + 1
+        yield raw_start + spans[i][0], raw_start + spans[last][1], size, piece, raw[spans[i][0]:spans[last][1]]
+
+
+def _tail(sentence: Sentence, max_size: int, count_tokens: Optional[Callable[[str], int]]) -> Optional[Sentence]:
+    """The trailing words of `sentence` that fit into `max_size`, None if not even one does"""
+    start, end, size, text, raw = sentence
+    words = text.split()
+    count = min(len(words), max_size if count_tokens is None else len(words) * max_size // max(size, 1))
+    while count > 0:
+        piece = ' '.join(words[-count:])
+        piece_size = count_tokens(piece) if count_tokens else count
+        if piece_size <= max_size:
+            offset = [match.start() for match in WORD.finditer(raw)][-count]
+            return start + offset, end, piece_size, piece, raw[offset:]
+        count -= 1
+    return None
+
+
+def split_sentences(pages: Iterable[str], max_size: int, count_tokens: Optional[Callable[[str], int]] = None) -> Iterator[Sentence]:
+    """
+    Split a stream of page texts into sentences in a single pass. Sentences end at
+    terminal punctuation followed by whitespace (including the Mongolian script's
+    ᠃ and ᠉) or at paragraph breaks, and may continue across pages.
+
+    Yields:
+        tuple: (start, end, size, text, raw) with character offsets into the pages joined
+        by newlines, size in words or tokens, whitespace-normalized and raw text
+    """
+    carry: List[str] = []  # unterminated sentence continuing on the next page
+    carry_start = 0
+    base = 0  # offset of the current page within the document
+
+    for page in pages:
+        position = 0
+        for match in SENTENCE_END.finditer(page):
+            if carry:
+                # Pages are joined by a newline so words at a page break do not run together
+                raw, raw_start = '\n'.join(carry + [page[:match.end()]]), carry_start
+                carry = []
+            else:
+                raw, raw_start = page[position:match.end()], base + position
+            yield from _measure(raw, raw_start, max_size, count_tokens)
+            position = match.end()
+
+        if position < len(page):
+            if not carry:
+                carry_start = base + position
+            carry.append(page[position:])
+        base += len(page) + 1
+
+    if carry:
+        yield from _measure('\n'.join(carry), carry_start, max_size, count_tokens)
+
+
+def stream_chunks(
+        pages: Iterable[str],
+        filename: str,
+        chunk_size=200,
+        overlap=50,
+        count_tokens: Optional[Callable[[str], int]] = None,
+        app_id: str = DEFAULT_APP_ID) -> Iterator[Dict[str, Any]]:
+    """
+    Incrementally chunk a stream of page texts into whole sentences, carrying overlap
+    across page boundaries. The text is scanned once and only the sentences of the
+    current chunk are held in memory.
+
+    A chunk is closed before the sentence that would take it over `chunk_size`, and
+    the next one starts with the trailing sentences that fit into `overlap`, or with
+    the last words of the final sentence when no whole sentence does. Sentences longer
+    than `chunk_size - overlap` are cut into pieces, leaving room for that overlap.
+    Sizes are counted in words, or in tokens when `count_tokens` is given. Each chunk
+    records the character span it covers in the page texts joined by newlines under
+    "metadata".
+
+    Args:
+        pages (Iterable[str]): Raw page texts, e.g. from `extract_pages`
+        chunk_size (int): Target number of words (or tokens) per chunk (default: 200)
+        overlap (int): Number of words (or tokens) to overlap between chunks (default: 50)
+        count_tokens (callable): Tokenizer token count of a string, e.g. `estimate_tokens`
+        app_id (str): Application (tenant) the chunks belong to
+
+    Yields:
+        dict: Chunks ready for vector database
+    """
+    window: Deque[Sentence] = deque()
+    size = 0
+    fresh = False  # whether the window holds a sentence not yet emitted
+    # "ingest.chunk" covers the scanning and packing behind each chunk, not the consumer's time
+    resumed = time.perf_counter()
+
+    for sentence in split_sentences(pages, max(1, chunk_size - overlap), count_tokens):
+        if size + sentence[2] > chunk_size:
+            if fresh:
+                chunk = _chunk(window, filename, app_id, size)
+                tracer.observe("span_seconds", time.perf_counter() - resumed, span="ingest.chunk")
+                yield chunk
+                resumed = time.perf_counter()
+                fresh = False
+
+            last = window[-1] if window else None
+            keep, kept_size = 0, 0
+            for _, _, length, _, _ in reversed(window):
+                if kept_size + length > overlap:
+                    break
+                keep += 1
+                kept_size += length
+            while window and (len(window) > keep or size + sentence[2] > chunk_size):
+                size -= window.popleft()[2]
+
+            if not window and last is not None and overlap > 0:
+                # Long or unpunctuated sentences: overlap by words rather than not at all
+                tail = _tail(last, min(overlap, chunk_size - sentence[2]), count_tokens)
+                if tail is not None:
+                    window.append(tail)
+                    size += tail[2]
+
+        window.append(sentence)
+        size += sentence[2]
+        fresh = True
+
+    if fresh:
+        chunk = _chunk(window, filename, app_id, size)
+        tracer.observe("span_seconds", time.perf_counter() - resumed, span="ingest.chunk")
+        yield chunk
+
+
+def _chunk(window: Deque[Sentence], filename: str, app_id: str, size: int) -> Dict[str, Any]:
+    start, end = window[0][0], window[-1][1]
+    return {
+        "content": ' '.join(sentence[3] for sentence in window),
+        "app_id": app_id,
+        "document_path": filename,
+        "offset": start,
+        "metadata": {"start": start, "end": end, "size": size}
+    }
+
+
+def chunk_id(chunk: Dict) -> str:
+    """
+    Deterministic UUID of a chunk derived from its document, offset and content, so
+    re-ingesting an unchanged document produces the same IDs and becomes an upsert.
+    """
+    content_hash = hashlib.sha256(chunk["content"].encode("utf-8")).hexdigest()
+    return weaviate.util.generate_uuid5(f"{chunk['document_path']}\x00{chunk.get('offset', 0)}\x00{content_hash}")
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most `size` items"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def group_by_app_id(documents: Iterable[Dict]) -> Dict[str, List[Dict]]:
+    """Split documents by the application (tenant) they belong to, keeping their order"""
+    groups: Dict[str, List[Dict]] = {}
+    for doc in documents:
+        groups.setdefault(doc.get("app_id") or DEFAULT_APP_ID, []).append(doc)
+    return groups
@@ -0,0 +1,154 @@
+"""
+Bulk-ingest a directory tree of PDFs into the vector database.
+
+Text extraction runs in a process pool while the main process embeds and
+inserts the documents that are already extracted. Finished documents are
+recorded in a checkpoint file, so a killed run picks up where it stopped.
+Documents that cannot be read or ingested are logged and skipped; they are
+not checkpointed and will be tried again on the next run.
+
+    python -m utils.ingest path/to/pdfs --workers 8
+"""
+import os
+import json
+import time
+import argparse
+import logging
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Dict, List, Tuple
+from utils.fms import DEFAULT_APP_ID, extract_pages, stream_chunks
+
+logger = logging.getLogger()
+
+def extract_document(path: str) -> Tuple[str, List[str], float]:
+    """Process pool worker: extract every page of one PDF"""
+    start_time = time.perf_counter()
+    pages = list(extract_pages(path))
+    return path, pages, time.perf_counter() - start_time
+
+
+def find_pdfs(root: str) -> List[str]:
+    paths = []
+    for directory, _, filenames in os.walk(root):
+        paths.extend(os.path.join(directory, name) for name in filenames if name.lower().endswith(".pdf"))
+    return sorted(paths)
+
+
+class Checkpoint:
+    """JSON record of finished documents keyed by path, invalidated when a file's size or mtime changes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, Dict[str, float]] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.done = json.load(f)
+
+    @staticmethod
+    def fingerprint(path: str) -> Dict[str, float]:
+        stat = os.stat(path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    def is_done(self, path: str) -> bool:
+        return self.done.get(path) == self.fingerprint(path)
+
+    def mark_done(self, path: str):
+        self.done[path] = self.fingerprint(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Write-then-rename so a kill mid-write never corrupts the checkpoint
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(self.done, f)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", help="Directory searched recursively for PDFs")
+    parser.add_argument("--checkpoint", default="cache/ingest_checkpoint.json")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--local", action="store_true", help="Ingest into the embedded local index instead of Weaviate")
+    parser.add_argument("--app-id", default=DEFAULT_APP_ID, help="Application (tenant) the documents belong to")
+    args = parser.parse_args()
+
+    if args.local:
+        from utils.localdb import LocalDatabaseManager
+        db = LocalDatabaseManager()
+    else:
+        from utils.dbms import WeaviateDatabaseManager
+        db = WeaviateDatabaseManager()
+    db.run(lambda async_client: db.create_collect(async_client))
+
+    checkpoint = Checkpoint(args.checkpoint)
+    paths = [path for path in find_pdfs(args.root) if not checkpoint.is_done(path)]
+    logger.info(f"{len(paths)} documents to ingest ({len(checkpoint.done)} already done).")
+
+    totals = {"documents": 0, "failed": 0, "pages": 0, "chunks": 0, "inserted": 0, "extract_seconds": 0.0, "ingest_seconds": 0.0}
+    start_time = time.perf_counter()
+
+    # The manager already runs the event loop, batcher and possibly CUDA, which a forked worker must not inherit
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        queued = iter(paths)
+        pending: Dict[Future, str] = {}
+
+        def refill():
+            # Keep at most two extractions per worker ahead of the embedding stage
+            while len(pending) < 2 * args.workers and (path := next(queued, None)) is not None:
+                pending[pool.submit(extract_document, path)] = path
+
+        refill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                refill()
+
+                ingest_start = time.perf_counter()
+                document_path = os.path.relpath(path, args.root)
+                try:
+                    _, pages, extract_seconds = future.result()
+                    summary = db.run(lambda async_client: db.stream_insert(
+                        async_client,
+                        stream_chunks(pages, document_path, app_id=args.app_id),
+                        batch_size=args.batch_size,
+                        max_concurrency=args.max_concurrency
+                    ))
+                except Exception as e:
+                    logger.info(f"Skipping '{document_path}', it could not be ingested: {e}")
+                    totals["failed"] += 1
+                    continue
+
+                if summary["failed"]:
+                    logger.info(f"{summary['failed']} chunks of '{document_path}' failed, it will be retried on the next run.")
+                else:
+                    checkpoint.mark_done(path)
+
+                totals["documents"] += 1
+                totals["pages"] += len(pages)
+                totals["chunks"] += summary["inserted"] + summary["skipped"]
+                totals["inserted"] += summary["inserted"]
+                totals["extract_seconds"] += extract_seconds
+                totals["ingest_seconds"] += time.perf_counter() - ingest_start
+
+                elapsed = time.perf_counter() - start_time
+                print(
+                    f"[{totals['documents']}/{len(paths)}] {document_path}: "
+                    f"{totals['pages'] / elapsed:.1f} pages/s, "
+                    f"{totals['chunks'] / max(totals['ingest_seconds'], 1e-9):.1f} chunks/s, "
+                    f"{totals['inserted'] / max(totals['ingest_seconds'], 1e-9):.1f} inserts/s"
+                )
+
+    elapsed = time.perf_counter() - start_time
+    print(
+        f"Ingested {totals['documents']} documents ({totals['failed']} failed, {totals['pages']} pages, "
+        f"{totals['chunks']} chunks, {totals['inserted']} inserted) in {elapsed:.1f}s. "
+        f"Extraction: {totals['pages'] / max(totals['extract_seconds'], 1e-9):.1f} pages/s per worker, "
+        f"embedding + insert: {totals['chunks'] / max(totals['ingest_seconds'], 1e-9):.1f} chunks/s, "
+        f"{totals['inserted'] / max(totals['ingest_seconds'], 1e-9):.1f} inserts/s."
+    )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,420 @@
+import os
+import json
+import shutil
+import time
+import asyncio
+import logging
+import threading
+import numpy as np
+
+from typing import List, Dict, Any, Optional, Iterable, Tuple, Set
+from utils.fms import DEFAULT_APP_ID, batched, chunk_id, group_by_app_id
+from utils.connection import BackgroundLoop
+from utils.dbms import WeaviateDatabaseManager, tenant_name
+
+logger = logging.getLogger()
+
+class LocalVectorIndex:
+    """
+    Append-only vector store kept in a directory.
+
+    Vectors live in `vectors.f32`, a raw float32 matrix that is memory-mapped for
+    search, and every metadata column lives in its own JSON-lines file. Rows are
+    never rewritten: replacing or deleting a row appends its number to
+    `deleted.jsonl` and masks it out of searches. Search is
+    an exact, vectorized cosine top-k; once the index holds `ivf_min_rows` rows an
+    inverted-file (IVF) index restricts it to the `n_probe` closest clusters.
+    """
+
+    columns = ("uuid", "content", "app_id", "document_path", "metadata")
+
+    def __init__(self, path: str, dimension: int, ivf_min_rows: int = 50000, n_probe: int = 8):
+        self.path = path
+        self.dimension = dimension
+        self.ivf_min_rows = ivf_min_rows
+        self.n_probe = n_probe
+        self.lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self.load()
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def deleted_path(self) -> str:
+        return os.path.join(self.path, "deleted.jsonl")
+
+    def column_path(self, column: str) -> str:
+        return os.path.join(self.path, f"{column}.jsonl")
+
+    def load(self):
+        with self.lock:
+            self.data: Dict[str, List[Any]] = {}
+            for column in self.columns:
+                if os.path.exists(self.column_path(column)):
+                    with open(self.column_path(column), "r", encoding="utf-8") as f:
+                        self.data[column] = [json.loads(line) for line in f]
+                else:
+                    self.data[column] = None
+
+            # A crash between the vector and column writes leaves a torn tail, drop it
+            rows = min((len(values) for values in self.data.values() if values is not None), default=0)
+            if os.path.exists(self.vectors_path):
+                rows = min(rows, os.path.getsize(self.vectors_path) // (4 * self.dimension))
+            for column in self.columns:
+                if self.data[column] is None:
+                    # Column added after the index was built
+                    self.data[column] = [None] * rows
+                    if rows:
+                        self._rewrite_column(column)
+                elif len(self.data[column]) > rows:
+                    del self.data[column][rows:]
+                    self._rewrite_column(column)
+
+            self.rows = rows
+            self._map_vectors()
+
+            self.alive = np.ones(rows, dtype=bool)
+            if os.path.exists(self.deleted_path):
+                with open(self.deleted_path, "r") as f:
+                    deleted = [int(line) for line in f if line.strip()]
+                self.alive[[row for row in deleted if row < rows]] = False
+            self.row_of = {
+                uuid: row for row, uuid in enumerate(self.data["uuid"]) if self.alive[row]
+            }
+            self.centroids = None
+            self.assignments = None
+            if self.rows >= self.ivf_min_rows:
+                self.build_ivf()
+
+    def _rewrite_column(self, column: str):
+        with open(self.column_path(column), "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(value, ensure_ascii=False) + "\n" for value in self.data[column])
+
+    def _map_vectors(self):
+        if self.rows:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.rows, self.dimension))
+        else:
+            self.vectors = np.empty((0, self.dimension), dtype=np.float32)
+
+    def reset(self):
+        with self.lock:
+            for path in [self.vectors_path, self.deleted_path] + [self.column_path(column) for column in self.columns]:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.load()
+
+    def append(self, documents: List[Dict[str, Any]], vectors: np.ndarray):
+        """Append rows to the end of the vector file and every column file, replacing rows with the same uuid"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        with self.lock:
+            self.delete([self.row_of[doc["uuid"]] for doc in documents if doc["uuid"] in self.row_of])
+            with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as f:
+                # Overwrite a torn tail left by an interrupted write instead of misaligning rows
+                f.seek(self.rows * 4 * self.dimension)
+                f.write(vectors.tobytes())
+                f.truncate()
+            for column in self.columns:
+                values = [doc.get(column) for doc in documents]
+                with open(self.column_path(column), "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(value, ensure_ascii=False) + "\n" for value in values)
+                self.data[column].extend(values)
+
+            first_row = self.rows
+            self.rows += len(documents)
+            self._map_vectors()
+            self.alive = np.concatenate([self.alive, np.ones(len(documents), dtype=bool)])
+            for row, doc in enumerate(documents, start=first_row):
+                self.row_of[doc["uuid"]] = row
+
+            if self.centroids is not None:
+                self.assignments = np.concatenate([self.assignments, self._assign(vectors)])
+            elif self.rows >= self.ivf_min_rows:
+                self.build_ivf()
+            logger.info(f"Appended rows {first_row}..{self.rows - 1} to local index at {self.path}")
+
+    def delete(self, rows: List[int]):
+        """Tombstone rows so they no longer show up in searches"""
+        if not rows:
+            return
+        with self.lock:
+            with open(self.deleted_path, "a") as f:
+                f.writelines(f"{row}\n" for row in rows)
+            self.alive[rows] = False
+            for row in rows:
+                self.row_of.pop(self.data["uuid"][row], None)
+
+    def build_ivf(self, n_lists: Optional[int] = None, iterations: int = 10):
+        """Train k-means centroids on a sample and assign every row to its closest one"""
+        with self.lock:
+            n_lists = n_lists or max(1, int(np.sqrt(self.rows)))
+            rng = np.random.default_rng(0)
+            sample = self.vectors[rng.choice(self.rows, min(self.rows, n_lists * 64), replace=False)]
+            centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                for i in range(n_lists):
+                    members = sample[labels == i]
+                    if len(members):
+                        centroid = members.mean(axis=0)
+                        centroids[i] = centroid / max(np.linalg.norm(centroid), 1e-12)
+
+            self.centroids = centroids
+            self.assignments = self._assign(self.vectors)
+            logger.info(f"Built IVF index with {n_lists} lists over {self.rows} rows")
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        labels = []
+        for start in range(0, len(vectors), 65536):
+            labels.append(np.argmax(vectors[start:start + 65536] @ self.centroids.T, axis=1))
+        return np.concatenate(labels) if labels else np.empty(0, dtype=np.int64)
+
+    def search(self, query: np.ndarray, limit: int = 5, distance_threshold: Optional[float] = None) -> List[Tuple[int, float]]:
+        """Return (row, cosine distance) pairs of the nearest rows, closest first"""
+        with self.lock:
+            if self.rows == 0:
+                return []
+
+            if self.centroids is not None:
+                probes = np.argsort(-(self.centroids @ query))[:self.n_probe]
+                candidates = np.flatnonzero(np.isin(self.assignments, probes) & self.alive)
+                distances = 1.0 - self.vectors[candidates] @ query
+            else:
+                candidates = None
+                distances = np.where(self.alive, 1.0 - self.vectors @ query, np.inf)
+
+        if distance_threshold is not None:
+            keep = np.flatnonzero(distances <= distance_threshold)
+        else:
+            keep = np.flatnonzero(np.isfinite(distances))
+
+        if len(keep) > limit:
+            keep = keep[np.argpartition(distances[keep], limit)[:limit]]
+        keep = keep[np.argsort(distances[keep])]
+
+        rows = candidates[keep] if candidates is not None else keep
+        return [(int(row), float(distances[i])) for row, i in zip(rows, keep)]
+
+    def row(self, index: int) -> Dict[str, Any]:
+        return {column: self.data[column][index] for column in self.columns}
+
+
+class LocalConnection:
+    """Stand-in for WeaviateConnectionManager: runs operations on a background loop without a client"""
+
+    def __init__(self):
+        self.loop = BackgroundLoop("local-index-loop")
+
+    def run(self, operation, timeout: Optional[float] = None):
+        return self.loop.run(operation(None), timeout)
+
+    def close(self):
+        self.loop.close()
+
+
+class LocalDatabaseManager(WeaviateDatabaseManager):
+    """
+    Same `create_collect` / `batch_insert` / `search_database` surface as
+    WeaviateDatabaseManager, backed by in-process LocalVectorIndex partitions so
+    companion can run without the Weaviate container. The `async_client` arguments
+    are accepted for compatibility and ignored.
+
+    Every app_id gets its own partition in `<path>/Documents/<app_id>`, loaded on
+    first use, so a search only scans the vectors of one application. Idle
+    partitions are unloaded from memory by `offload_idle_tenants`.
+    """
+
+    def __init__(self, path: str = os.getenv("LOCAL_INDEX_PATH", "cache/local_index"), **kwargs):
+        super().__init__(connection=LocalConnection(), **kwargs)
+        self.path = os.path.join(path, self.collection_name)
+        self.indexes: Dict[str, LocalVectorIndex] = {}
+        self.tenant_lock = threading.Lock()
+        self.multi_tenant = True
+        os.makedirs(self.path, exist_ok=True)
+        self._migrate_unpartitioned()
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def _migrate_unpartitioned(self):
+        """Move an index written before partitioning by app_id into the default application's partition"""
+        legacy_files = [name for name in os.listdir(self.path) if name.endswith((".f32", ".jsonl"))]
+        if not legacy_files:
+            return
+        target = os.path.join(self.path, tenant_name(DEFAULT_APP_ID))
+        os.makedirs(target, exist_ok=True)
+        for name in legacy_files:
+            os.replace(os.path.join(self.path, name), os.path.join(target, name))
+        logger.info(f"Moved the unpartitioned local index into the '{DEFAULT_APP_ID}' partition.")
+
+    def tenants(self) -> List[str]:
+        """Applications with a partition on disk"""
+        return sorted(name for name in os.listdir(self.path) if os.path.isdir(os.path.join(self.path, name)))
+
+    def tenant_index(self, app_id: str, create: bool = True) -> Optional[LocalVectorIndex]:
+        """Partition of `app_id`, loaded on first use; None if it does not exist and `create` is not set"""
+        with self.tenant_lock:
+            index = self.indexes.get(app_id)
+            if index is None:
+                path = os.path.join(self.path, tenant_name(app_id))
+                if not create and not os.path.isdir(path):
+                    return None
+                index = self.indexes[app_id] = LocalVectorIndex(path, self.encoder.dimension)
+            self.tenant_activity[app_id] = time.monotonic()
+            return index
+
+    async def create_collect(self, async_client=None, recreate: bool = False, index_settings: Optional[Dict[str, Any]] = None):
+        """
+        Record the encoder the index is built with, dropping every partition only if `recreate`
+        is set. `index_settings` are accepted for compatibility and ignored, the local index
+        always searches exactly (or through IVF once it is large).
+        """
+        if not recreate:
+            return await self.verify_collection()
+        with self.tenant_lock:
+            self.indexes.clear()
+        shutil.rmtree(self.path)
+        os.makedirs(self.path)
+        self.retrieval_cache.bump()
+        with open(self.meta_path, "w") as f:
+            json.dump(self.vector_space, f)
+        self.verified_collection = True
+        logger.info(f"Local collection '{self.collection_name}' created at {self.path}")
+
+    async def verify_collection(self, async_client=None):
+        if self.verified_collection:
+            return
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                recorded = json.load(f)
+            if recorded != self.vector_space:
+                raise ValueError(
+                    f"Local index '{self.path}' was built with {recorded}, "
+                    f"but the configured encoder is {self.vector_space}. Recreate the collection or change the encoder."
+                )
+        else:
+            with open(self.meta_path, "w") as f:
+                json.dump(self.vector_space, f)
+        self.verified_collection = True
+
+    def _append(self, documents: List[Dict[str, Any]], app_id: str):
+        vectors = self.embed_texts([doc["content"] for doc in documents])
+        self.tenant_index(app_id).append(
+            [{**doc, "uuid": chunk_id(doc)} for doc in documents],
+            np.asarray(vectors, dtype=np.float32)
+        )
+
+    async def existing_ids(self, async_client, ids: List[str], app_id: str = DEFAULT_APP_ID) -> Set[str]:
+        index = self.tenant_index(app_id, create=False)
+        return {uuid for uuid in ids if uuid in index.row_of} if index is not None else set()
+
+    async def delete_document(
+            self,
+            async_client,
+            document_path: str,
+            keep_ids: Optional[Set[str]] = None,
+            app_id: str = DEFAULT_APP_ID) -> int:
+        index = self.tenant_index(app_id, create=False)
+        if index is None:
+            return 0
+        keep_ids = keep_ids or set()
+        rows = [
+            row for uuid, row in list(index.row_of.items())
+            if index.data["document_path"][row] == document_path and uuid not in keep_ids
+        ]
+        if rows:
+            index.delete(rows)
+            self.retrieval_cache.bump()
+        logger.info(f"Deleted {len(rows)} stale chunks of '{document_path}'.")
+        return len(rows)
+
+    async def batch_insert(self, async_client, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return await self.stream_insert(async_client, documents, batch_size=max(1, len(documents)), replace=False)
+
+    async def stream_insert(
+            self,
+            async_client,
+            documents: Iterable[Dict[str, Any]],
+            batch_size: int = 64,
+            max_concurrency: int = 4,
+            replace: bool = True) -> Dict[str, Any]:
+        await self.verify_collection()
+        seen_ids: Dict[Tuple[str, str], Set[str]] = {}
+        summary = {"inserted": 0, "skipped": 0, "deleted": 0, "failed": 0, "batches": 0, "elapsed_seconds": 0.0}
+        start_time = time.perf_counter()
+
+        for batch in batched(documents, batch_size):
+            for app_id, tenant_batch in group_by_app_id(batch).items():
+                ids = [chunk_id(doc) for doc in tenant_batch]
+                for doc, uuid in zip(tenant_batch, ids):
+                    seen_ids.setdefault((app_id, doc["document_path"]), set()).add(uuid)
+
+                existing = await self.existing_ids(async_client, ids, app_id)
+                tenant_batch = [doc for doc, uuid in zip(tenant_batch, ids) if uuid not in existing]
+                summary["skipped"] += len(existing)
+                if not tenant_batch:
+                    continue
+
+                await asyncio.to_thread(self._append, tenant_batch, app_id)
+                self.retrieval_cache.bump()
+                summary["inserted"] += len(tenant_batch)
+                summary["batches"] += 1
+
+        if replace:
+            for (app_id, document_path), ids in seen_ids.items():
+                summary["deleted"] += await self.delete_document(async_client, document_path, ids, app_id)
+
+        summary["elapsed_seconds"] = time.perf_counter() - start_time
+        logger.info(
+            f"{summary['inserted']} objects successfully inserted into local {self.collection_name} "
+            f"({summary['skipped']} unchanged, {summary['deleted']} stale deleted)!"
+        )
+        return summary
+
+    async def offload_idle_tenants(self, async_client=None, idle_seconds: Optional[float] = None, status=None) -> List[str]:
+        """Unload partitions that were not used for `idle_seconds`; they are reloaded on their next use"""
+        idle_seconds = idle_seconds if idle_seconds is not None else self.tenant_idle_seconds
+        now = time.monotonic()
+        with self.tenant_lock:
+            idle = [
+                app_id for app_id in self.indexes
+                if now - self.tenant_activity.get(app_id, self.started) > idle_seconds
+            ]
+            for app_id in idle:
+                del self.indexes[app_id]
+        if idle:
+            logger.info(f"Unloaded {len(idle)} idle local partitions: {', '.join(idle)}")
+        return idle
+
+    async def _near_vector(
+            self,
+            async_client,
+            query_vector: List[float],
+            limit: int,
+            distance_threshold: float,
+            app_id: str = DEFAULT_APP_ID) -> List[Dict[str, Any]]:
+        index = self.tenant_index(app_id, create=False)
+        if index is None:
+            return []
+
+        start_time = time.perf_counter()
+        hits = index.search(np.asarray(query_vector, dtype=np.float32), limit, distance_threshold)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+        results = []
+        for row, distance in hits:
+            properties = index.row(row)
+            results.append({
+                "uuid": properties["uuid"],
+                "content": properties["content"],
+                "app_id": properties["app_id"],
+                "document_path": properties["document_path"],
+                "metadata": properties["metadata"],
+                "distance": distance
+            })
+
+        logger.info(f"Local index search of '{app_id}' over {len(index.row_of)} rows took {elapsed_ms:.3f} ms")
+        return results
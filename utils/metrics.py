@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import time
+import bisect
+import logging
+import threading
+import traceback
+
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("companion.trace")
+
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Tracer:
+    """
+    Lightweight tracing: `span` times a block of (sync or async) code, records it in a
+    per-stage duration histogram and emits one structured JSON log line. Histograms are
+    exported in the Prometheus text format by `render_prometheus` and `serve`.
+    """
+
+    def __init__(self, namespace: str = "companion", log_spans: bool = os.getenv("TRACE_LOG", "1") == "1"):
+        self.namespace = namespace
+        self.log_spans = log_spans
+        self.histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self.buckets: Dict[str, Tuple[float, ...]] = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric: str, buckets: Tuple[float, ...]):
+        self.buckets[metric] = buckets
+
+    def observe(self, metric: str, value: float, **labels: Any):
+        key = (metric, tuple(sorted((name, str(label)) for name, label in labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets.get(metric, DURATION_BUCKETS))
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name: str, log: bool = True, **attributes: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Time the enclosed block as stage `name`. The yielded dict can be filled with
+        extra attributes that only become known inside the block (they are logged,
+        not used as labels). High-frequency stages pass `log=False` and only feed
+        the histogram.
+        """
+        extra: Dict[str, Any] = {}
+        start_time = time.perf_counter()
+        error = None
+        try:
+            yield extra
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.observe("span_seconds", elapsed, span=name)
+            if log and self.log_spans:
+                logger.info(json.dumps(
+                    {"span": name, "duration_ms": round(elapsed * 1000, 3), "error": error, **attributes, **extra},
+                    ensure_ascii=False,
+                    default=str
+                ))
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self.lock:
+            by_metric: Dict[str, List] = {}
+            for (metric, labels), histogram in sorted(self.histograms.items()):
+                by_metric.setdefault(metric, []).append((labels, histogram))
+
+            for metric, series in by_metric.items():
+                name = f"{self.namespace}_{metric}"
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in series:
+                    label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+                    prefix = label_text + "," if label_text else ""
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+                    lines.append(f"{name}_sum{{{label_text}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{label_text}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Serve `/metrics` from a daemon thread"""
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        logging.getLogger().info(f"Metrics available at http://{host}:{port}/metrics")
+        return server
+
+    def profile(self, name: str, threshold_ms: Optional[float] = None):
+        """
+        Sample the stacks of all threads while the block runs and log the hottest ones
+        if it took longer than `threshold_ms` (defaults to PROFILE_SLOW_MS; disabled
+        when neither is set).
+        """
+        threshold_ms = threshold_ms if threshold_ms is not None else float(os.getenv("PROFILE_SLOW_MS", 0))
+        if threshold_ms <= 0:
+            return nullcontext()
+        return SamplingProfiler(name, threshold_ms)
+
+
+class SamplingProfiler:
+    """Context manager that samples thread stacks every `interval` seconds on a helper thread"""
+
+    def __init__(self, name: str, threshold_ms: float, interval: float = 0.005, top: int = 10):
+        self.name = name
+        self.threshold_ms = threshold_ms
+        self.interval = interval
+        self.top = top
+        self.samples: Counter = Counter()
+        self.stopped = threading.Event()
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = tuple(
+                    f"{summary.filename}:{summary.lineno} {summary.name}"
+                    for summary in traceback.extract_stack(frame, limit=8)
+                )
+                self.samples[(names.get(thread_id, str(thread_id)), stack)] += 1
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        self.thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        elapsed_ms = (time.perf_counter() - self.start_time) * 1000
+        if elapsed_ms < self.threshold_ms:
+            return False
+
+        total = sum(self.samples.values()) or 1
+        lines = [f"Slow request '{self.name}' took {elapsed_ms:.0f} ms, hottest stacks:"]
+        for (thread_name, stack), count in self.samples.most_common(self.top):
+            lines.append(f"  {count / total:6.1%} [{thread_name}] " + " <- ".join(reversed(stack)))
+        logger.info("\n".join(lines))
+        return False
+
+
+tracer = Tracer()
+tracer.register("llm_tokens_per_second", RATE_BUCKETS)